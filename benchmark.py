@@ -0,0 +1,618 @@
+"""
+Benchmarks de extracción, hashing y agrupación sobre catálogos sintéticos.
+
+    python benchmark.py run --pages 20 --images-per-page 8 --out resultados.json
+    python benchmark.py compare base.json resultados.json
+    python benchmark.py generate --out-dir /tmp/catalogos --target-mb 20
+    python benchmark.py fingerprints --products 150 --thresholds 4,6,8,10
+
+Cada etapa se repite --repeat veces y reporta throughput (mediana de las
+repeticiones), percentiles de latencia y el pico de RSS. La configuración se
+toma de las mismas variables de entorno que la API (EXECUTION_MODE,
+HASH_ENGINE, EXCEL_ENGINE, ...). LOG_LEVEL es WARNING por defecto para que
+los mensajes por página no cuenten en las mediciones.
+"""
+import argparse
+import json
+from collections import Counter
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy
+
+import synthetic_catalogs
+from memory import PeakMemoryMonitor
+
+DEFAULT_TOLERANCE = 10.0  # % de cambio que se considera regresión
+
+
+class Workload:
+    """
+    Catálogos generados para una corrida: un PDF y un XLSX de dos proveedores
+    que comparten parte de las imágenes
+    """
+
+    def __init__(self, directory, args):
+        self.directory = directory
+        self.params = {
+            'pages': args.pages,
+            'imagesPerPage': args.images_per_page,
+            'blocksPerRow': args.blocks_per_row,
+            'duplicateRatio': args.duplicate_ratio,
+            'xlsxProducts': args.xlsx_products,
+            'seed': args.seed,
+        }
+        self.image_px = args.image_px
+        if args.target_mb:
+            self.image_px = synthetic_catalogs.image_px_for_size(args.target_mb, args.pages * args.images_per_page)
+        self.params['imagePx'] = self.image_px
+
+        self.pdf = os.path.join(directory, 'provA.pdf')
+        self.xlsx = os.path.join(directory, 'provB.xlsx')
+        synthetic_catalogs.generate_pdf(
+            self.pdf, pages=args.pages, images_per_page=args.images_per_page,
+            blocks_per_row=args.blocks_per_row, duplicate_ratio=args.duplicate_ratio,
+            image_px=self.image_px, seed=args.seed,
+        )
+        synthetic_catalogs.generate_xlsx(
+            self.xlsx, products=args.xlsx_products, duplicate_ratio=args.duplicate_ratio,
+            image_px=self.image_px, seed=args.seed + 1,
+        )
+        self.params['pdfMB'] = round(os.path.getsize(self.pdf) / 1024 / 1024, 2)
+        self.params['xlsxMB'] = round(os.path.getsize(self.xlsx) / 1024 / 1024, 2)
+        self._images = None
+        self._products = None
+
+    def images(self):
+        """
+        Bytes de las imágenes del PDF (entrada de la etapa de hashing)
+        """
+        if self._images is None:
+            import fitz
+            with fitz.open(self.pdf) as doc:
+                xrefs = dict.fromkeys(img[0] for page in doc for img in page.get_images(full=True))
+                self._images = [doc.extract_image(xref)['image'] for xref in xrefs]
+        return self._images
+
+    def products(self, main):
+        """
+        Productos extraídos de ambos catálogos (entrada de la agrupación)
+        """
+        if self._products is None:
+            products = []
+            for provider, extract, path in (('provA', main.extract_from_pdf, self.pdf),
+                                            ('provB', main.extract_from_excel, self.xlsx)):
+                for product in extract(path):
+                    product['provider'] = provider
+                    products.append(product)
+            self._products = products
+        return [dict(p) for p in self._products]
+
+
+def percentile_ms(values, q):
+    return round(float(numpy.percentile(values, q)) * 1000, 3) if values else None
+
+
+def measure(main, repeat, run_once, unit, setup=None):
+    """
+    Ejecuta run_once() repeat veces; run_once devuelve (elementos, latencias en s).
+    Con setup, run_once(setup()) y setup no se cuenta en el tiempo.
+    """
+    runs = []
+    latencies = []
+    items = 0
+    with PeakMemoryMonitor(extra_pids=main.pool_worker_pids) as monitor:
+        for _ in range(repeat):
+            main._image_hash_memo.clear()  # Cada repetición en frío
+            args = (setup(),) if setup is not None else ()
+            start = time.perf_counter()
+            items, run_latencies = run_once(*args)
+            runs.append(time.perf_counter() - start)
+            latencies.extend(run_latencies)
+    median = float(numpy.median(runs))
+    return {
+        'unit': unit,
+        'items': items,
+        'repeat': repeat,
+        'seconds': {'min': round(min(runs), 4), 'median': round(median, 4), 'max': round(max(runs), 4)},
+        'throughput': round(items / median, 2) if median > 0 else None,
+        'latencyMs': {
+            'count': len(latencies),
+            'p50': percentile_ms(latencies, 50),
+            'p90': percentile_ms(latencies, 90),
+            'p99': percentile_ms(latencies, 99),
+            'max': percentile_ms(latencies, 100),
+        },
+        'memory': monitor.report(),
+    }
+
+
+def bench_pdf(main, workload, repeat):
+    """
+    extract_from_pdf; latencia por página
+    """
+    def run_once():
+        marks = [time.perf_counter()]
+        main.extract_from_pdf(workload.pdf, on_page=lambda done, total: marks.append(time.perf_counter()))
+        return len(marks) - 1, [b - a for a, b in zip(marks, marks[1:])]
+    return measure(main, repeat, run_once, 'pages')
+
+
+def bench_excel(main, workload, repeat):
+    """
+    extract_from_excel; latencia por archivo
+    """
+    def run_once():
+        start = time.perf_counter()
+        products = main.extract_from_excel(workload.xlsx)
+        return len(products), [time.perf_counter() - start]
+    return measure(main, repeat, run_once, 'products')
+
+
+def bench_hash(main, workload, repeat):
+    """
+    Motor de hash sobre las imágenes del PDF; latencia por lote
+    """
+    images = workload.images()
+
+    def run_once():
+        latencies = []
+        for start in range(0, len(images), main.HASH_BATCH_SIZE):
+            batch_start = time.perf_counter()
+            main.hash_engine.hash_many(images[start:start + main.HASH_BATCH_SIZE])
+            latencies.append(time.perf_counter() - batch_start)
+        return len(images), latencies
+    return measure(main, repeat, run_once, 'images')
+
+
+def make_grouping_bench(grouping_mode):
+    def bench(main, workload, repeat):
+        workload.products(main)  # La extracción (solo la primera vez) queda fuera de la medición
+
+        def run_once(products):
+            count = len(products)  # consolidate_products puede vaciar la lista
+            start = time.perf_counter()
+            main.consolidate_products(products, grouping_mode=grouping_mode)
+            return count, [time.perf_counter() - start]
+        # Copias nuevas en cada repetición, fuera del tiempo medido
+        return measure(main, repeat, run_once, 'products', setup=lambda: workload.products(main))
+    bench.__doc__ = f"consolidate_products en modo {grouping_mode}"
+    return bench
+
+
+def bench_uploads(main, workload, repeat):
+    """
+    extract_uploads de ambos archivos (modo de ejecución configurado, sin caché)
+    """
+    from werkzeug.datastructures import FileStorage
+
+    def run_once():
+        files = [FileStorage(stream=open(path, 'rb'), filename=os.path.basename(path))
+                 for path in (workload.pdf, workload.xlsx)]
+        start = time.perf_counter()
+        try:
+            products = main.extract_uploads(files)
+        finally:
+            for file in files:
+                file.close()
+        return len(products), [time.perf_counter() - start]
+
+    cache = main.extraction_cache
+    main.extraction_cache = None
+    try:
+        return measure(main, repeat, run_once, 'products')
+    finally:
+        main.extraction_cache = cache
+
+
+# Arranque en un proceso nuevo: importar main, wsgi (warm-up) y, con
+# archivos, la primera petición (sin caché de extracciones)
+STARTUP_SCRIPT = """
+import json, os, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+import wsgi
+result = {'import': imported - start, 'ready': time.perf_counter() - start}
+if len(sys.argv) > 1:
+    client = wsgi.app.test_client()
+    files = [(open(path, 'rb'), os.path.basename(path)) for path in sys.argv[1:]]
+    request_start = time.perf_counter()
+    response = client.post('/api/consolidate', data={'files': files, 'limit': '1'},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_data(as_text=True)
+    result['firstRequest'] = time.perf_counter() - request_start
+print(json.dumps(result))
+"""
+
+
+def run_startup(paths=()):
+    env = dict(os.environ, LOG_LEVEL='WARNING', EXTRACTION_CACHE_MAX_MB='0')
+    completed = subprocess.run(
+        [sys.executable, '-c', STARTUP_SCRIPT, *paths], capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def bench_startup(main, workload, repeat):
+    """
+    Proceso nuevo hasta tener la app lista (import + warm-up); latencia por arranque.
+    WARM_UP=off mide el arranque sin warm-up.
+    """
+    def run_once():
+        return 1, [run_startup()['ready']]
+    return measure(main, repeat, run_once, 'starts')
+
+
+def bench_first_request(main, workload, repeat):
+    """
+    Primera petición a /api/consolidate en un proceso recién arrancado
+    """
+    def run_once():
+        return 1, [run_startup((workload.pdf, workload.xlsx))['firstRequest']]
+    return measure(main, repeat, run_once, 'requests')
+
+
+# Reglas como estaban escritas dentro de extract_from_pdf, para comparar con rules.py
+LEGACY_HEADER_KEYWORDS = [
+    'PRODUCTO', 'FOTO', 'MODELO', 'MAYOREO', 'MITAD', 'CAJA', 'CANTIDAD',
+    'DESCRIPCION', 'DESCRIPCIÓN', 'PRECIO', 'MOQ', 'SKU', 'CODIGO',
+    'CATEGORIA', 'DISPONIBILIDAD', 'PZAS', 'MENUDEO', 'LISTA', 'CODIGO DE PRODUCTO'
+]
+
+
+def legacy_is_header(text_upper):
+    return any(keyword in text_upper for keyword in LEGACY_HEADER_KEYWORDS)
+
+
+def legacy_moq(texts):
+    moq = 100
+    for text in texts:
+        if 'PIEZA' in text.upper() or 'DOCENA' in text.upper():
+            moq_match = re.search(r'(\d+)\s*(?:PIEZA|DOCENA|CAJITA)', text, re.IGNORECASE)
+            if moq_match:
+                moq = int(moq_match.group(1))
+                break
+    return moq
+
+
+def legacy_category(description):
+    category = 'GENERAL'
+    desc_lower = description.lower()
+    if any(word in desc_lower for word in ['gorro', 'bufanda', 'caballero', 'dama', 'niño', 'niña', 'sombrero']):
+        category = 'ROPA Y ACCESORIOS'
+    elif any(word in desc_lower for word in ['navidad', 'luces', 'estrellitas', 'decoracion', 'regalo']):
+        category = 'DECORACION'
+    elif any(word in desc_lower for word in ['bolsa', 'empaque', 'papel']):
+        category = 'EMPAQUES Y REGALOS'
+    elif any(word in desc_lower for word in ['impermeable', 'tira', 'led', 'usb']):
+        category = 'ELECTRONICA'
+    return category
+
+
+def rule_rows(workload):
+    """
+    Filas de texto como las ve el extractor: bloques por fila más una cabecera
+    """
+    count = workload.params['pages'] * workload.params['imagesPerPage']
+    rows = []
+    for description, sku, prices, moq in synthetic_catalogs.product_rows(count, workload.params['seed']):
+        texts = [description, sku, ' '.join(str(p) for p in prices), f"{moq} PIEZAS"]
+        texts += synthetic_catalogs.FILLER[:max(0, workload.params['blocksPerRow'] - len(texts))]
+        texts.append('FOTO  DESCRIPCION  SKU  PRECIO MAYOREO  MOQ')
+        rows.append((description, texts))
+    return rows
+
+
+def apply_rules(rows, is_header, moq, category):
+    results = []
+    for description, texts in rows:
+        kept = [text for text in texts if not is_header(text.upper())]
+        results.append((len(kept), moq(kept), category(description)))
+    return results
+
+
+def make_rules_bench(engine):
+    def bench(main, workload, repeat):
+        rows = rule_rows(workload)
+        if engine:
+            rules = main.rule_engine.base
+            functions = (rules.is_header, rules.moq, rules.category)
+        else:
+            functions = (legacy_is_header, legacy_moq, legacy_category)
+        if apply_rules(rows, *functions) != apply_rules(rows, legacy_is_header, legacy_moq, legacy_category):
+            raise AssertionError('rules.json no reproduce las reglas anteriores')
+
+        def run_once():
+            start = time.perf_counter()
+            apply_rules(rows, *functions)
+            return len(rows), [time.perf_counter() - start]
+        return measure(main, repeat, run_once, 'rows')
+    bench.__doc__ = 'Reglas compiladas (rules.py)' if engine else 'Reglas inline anteriores'
+    return bench
+
+
+STAGES = {
+    'pdf': bench_pdf,
+    'excel': bench_excel,
+    'hash': bench_hash,
+    'grouping-exact': make_grouping_bench('exact'),
+    'grouping-similar': make_grouping_bench('similar'),
+    'uploads': bench_uploads,
+    'rules-inline': make_rules_bench(False),
+    'rules-engine': make_rules_bench(True),
+    'startup': bench_startup,
+    'first-request': bench_first_request,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args):
+    stages = args.stages.split(',') if args.stages else list(STAGES)
+    unknown = [name for name in stages if name not in STAGES]
+    if unknown:
+        sys.exit(f"Etapas desconocidas: {', '.join(unknown)} (disponibles: {', '.join(STAGES)})")
+
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import main
+
+    directory = tempfile.mkdtemp(prefix='catalog-bench-')
+    try:
+        workload = Workload(directory, args)
+        print(f"📦 Catálogos: PDF {workload.params['pdfMB']} MB, XLSX {workload.params['xlsxMB']} MB")
+
+        results = {}
+        for name in stages:
+            results[name] = STAGES[name](main, workload, args.repeat)
+            stage = results[name]
+            print(f"⏱️ {name}: {stage['throughput']} {stage['unit']}/s, "
+                  f"p50 {stage['latencyMs']['p50']} ms, p99 {stage['latencyMs']['p99']} ms, "
+                  f"pico +{stage['memory']['peakDeltaMB']} MB")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': time.time(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'settings': {
+                'executionMode': main.EXECUTION_MODE,
+                'maxWorkers': main.MAX_WORKERS,
+                'hashEngine': main.HASH_ENGINE,
+                'excelEngine': main.EXCEL_ENGINE,
+                'groupingIndex': main.GROUPING_INDEX,
+                'hammingThreshold': main.HAMMING_THRESHOLD,
+            },
+            'workload': workload.params,
+        },
+        'stages': results,
+    }
+    with open(args.out, 'w') as fh:
+        json.dump(report, fh, indent=2)
+    print(f"💾 Resultados en {args.out}")
+
+
+def percent_change(old, new):
+    if not old or new is None:
+        return None
+    return round((new - old) / old * 100, 1)
+
+
+def compare(args):
+    """
+    Compara dos resultados. Sale con código 1 si alguna etapa perdió más de
+    --tolerance % de throughput o subió su p99 más de ese porcentaje.
+    """
+    with open(args.base) as fh:
+        base = json.load(fh)
+    with open(args.new) as fh:
+        new = json.load(fh)
+
+    if base['meta'].get('workload') != new['meta'].get('workload'):
+        print('⚠️ Las cargas de trabajo son distintas; la comparación puede no ser válida')
+
+    regressions = []
+    print(f"{'etapa':<18} {'throughput':>12} {'Δ%':>7} {'p99 ms':>10} {'Δ%':>7} {'pico MB':>8}")
+    for name, stage in new['stages'].items():
+        old = base['stages'].get(name)
+        if old is None:
+            print(f"{name:<18} {stage['throughput']:>12} {'(nueva)':>7}")
+            continue
+        throughput_change = percent_change(old['throughput'], stage['throughput'])
+        p99_change = percent_change(old['latencyMs']['p99'], stage['latencyMs']['p99'])
+        print(f"{name:<18} {stage['throughput']:>12} {throughput_change if throughput_change is not None else '-':>7} "
+              f"{stage['latencyMs']['p99']:>10} {p99_change if p99_change is not None else '-':>7} "
+              f"{stage['memory']['peakDeltaMB']:>8}")
+        if throughput_change is not None and throughput_change < -args.tolerance:
+            regressions.append(name)
+        elif p99_change is not None and p99_change > args.tolerance:
+            regressions.append(name)
+
+    if regressions:
+        print(f"❌ Regresiones (> {args.tolerance}%): {', '.join(regressions)}")
+        return 1
+    print('✅ Sin regresiones')
+    return 0
+
+
+def pair_scores(predicted, labels):
+    """
+    Precisión y exhaustividad por pares: un par de imágenes es positivo si
+    queda en el mismo grupo, y correcto si además es del mismo producto
+    """
+    def pairs(counts):
+        return sum(n * (n - 1) // 2 for n in counts.values())
+
+    true_positive = pairs(Counter(zip(predicted, labels)))
+    predicted_pairs = pairs(Counter(predicted))
+    labeled_pairs = pairs(Counter(labels))
+    precision = true_positive / predicted_pairs if predicted_pairs else 1.0
+    recall = true_positive / labeled_pairs if labeled_pairs else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {'precision': round(precision, 4), 'recall': round(recall, 4), 'f1': round(f1, 4)}
+
+
+def fingerprints_bench(args):
+    """
+    Cada huella sobre una muestra etiquetada (synthetic_catalogs.labeled_images):
+    throughput de hash y precisión/exhaustividad de la agrupación por umbral
+    """
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import main
+    from fingerprints import FINGERPRINT_BACKENDS, make_engine
+    from grouping import cluster_hashes
+    from hashing import PhashEngine
+
+    sample = synthetic_catalogs.labeled_images(
+        products=args.products, variants=args.variants, family_size=args.family_size,
+        size=args.image_px, seed=args.seed,
+    )
+    labels = [label for label, _image in sample]
+    images = [image for _label, image in sample]
+    thresholds = [int(value) for value in args.thresholds.split(',')]
+    print(f"🖼️ Muestra: {args.products} productos, {len(images)} imágenes")
+
+    results = {}
+    for name in FINGERPRINT_BACKENDS:
+        engine = make_engine(name, PhashEngine(main.HASH_ENGINE, main.HASH_SIZE, main.MAX_IMAGE_SIZE))
+        runs = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            hashes = engine.hash_many(images)
+            runs.append(time.perf_counter() - start)
+        values = [int(image_hash, 16) for image_hash in hashes]
+        unique = list(dict.fromkeys(values))
+        position = {value: i for i, value in enumerate(unique)}
+        prefilter = None
+        if name == 'composite':
+            prefilter = args.prefilter_threshold
+            if prefilter is None:
+                prefilter = main.FINGERPRINT_PREFILTER_THRESHOLD
+
+        by_threshold = {}
+        for threshold in thresholds:
+            start = time.perf_counter()
+            groups = cluster_hashes(unique, threshold, bits=engine.bits, prefilter_threshold=prefilter)
+            seconds = time.perf_counter() - start
+            predicted = [groups[position[value]] for value in values]
+            by_threshold[threshold] = {
+                **pair_scores(predicted, labels),
+                'groups': len(set(groups)),
+                'groupingSeconds': round(seconds, 4),
+            }
+        median = float(numpy.median(runs))
+        results[name] = {
+            'version': engine.version,
+            'bits': engine.bits,
+            'throughput': round(len(images) / median, 2),
+            'prefilterThreshold': prefilter,
+            'thresholds': by_threshold,
+        }
+
+    print(f"{'huella':<10} {'img/s':>9} {'umbral':>7} {'precisión':>10} {'exhaust.':>9} {'f1':>7} {'grupos':>7}")
+    for name, result in results.items():
+        for threshold, scores in result['thresholds'].items():
+            print(f"{name:<10} {result['throughput']:>9} {threshold:>7} {scores['precision']:>10} "
+                  f"{scores['recall']:>9} {scores['f1']:>7} {scores['groups']:>7}")
+
+    report = {
+        'meta': {
+            'timestamp': time.time(),
+            'revision': git_revision(),
+            'hashEngine': main.HASH_ENGINE,
+            'sample': {
+                'products': args.products, 'variants': args.variants, 'familySize': args.family_size,
+                'imagePx': args.image_px, 'seed': args.seed, 'images': len(images),
+            },
+        },
+        'backends': results,
+    }
+    with open(args.out, 'w') as fh:
+        json.dump(report, fh, indent=2)
+    print(f"💾 Resultados en {args.out}")
+
+
+def generate(args):
+    os.makedirs(args.out_dir, exist_ok=True)
+    workload = Workload(args.out_dir, args)
+    print(f"📦 {workload.pdf} ({workload.params['pdfMB']} MB), {workload.xlsx} ({workload.params['xlsxMB']} MB)")
+
+
+def add_workload_arguments(parser):
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--images-per-page', type=int, default=8)
+    parser.add_argument('--blocks-per-row', type=int, default=4)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.3)
+    parser.add_argument('--xlsx-products', type=int, default=100)
+    parser.add_argument('--image-px', type=int, default=synthetic_catalogs.DEFAULT_IMAGE_PX)
+    parser.add_argument('--target-mb', type=float, default=0,
+                        help='Tamaño aproximado del PDF; ajusta --image-px')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks del extractor de catálogos')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Genera catálogos y mide cada etapa')
+    add_workload_arguments(run_parser)
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--stages', help=f"Lista separada por comas ({','.join(STAGES)})")
+    run_parser.add_argument('--out', default='benchmark-results.json')
+
+    compare_parser = commands.add_parser('compare', help='Compara dos archivos de resultados')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+
+    generate_parser = commands.add_parser('generate', help='Solo genera los catálogos sintéticos')
+    add_workload_arguments(generate_parser)
+    generate_parser.add_argument('--out-dir', required=True)
+
+    fingerprints_parser = commands.add_parser(
+        'fingerprints', help='Precisión/exhaustividad y throughput de cada huella de imagen'
+    )
+    fingerprints_parser.add_argument('--products', type=int, default=150)
+    fingerprints_parser.add_argument('--variants', type=int, default=5,
+                                     help='Variantes por producto (recorte, color, recompresión, tamaño, margen)')
+    fingerprints_parser.add_argument('--family-size', type=int, default=3,
+                                     help='Productos distintos que comparten casi todo el mosaico')
+    fingerprints_parser.add_argument('--image-px', type=int, default=synthetic_catalogs.DEFAULT_IMAGE_PX)
+    fingerprints_parser.add_argument('--thresholds', default='4,6,8,10')
+    fingerprints_parser.add_argument('--prefilter-threshold', type=int,
+                                     help='Umbral del ahash en composite (default FINGERPRINT_PREFILTER_THRESHOLD)')
+    fingerprints_parser.add_argument('--repeat', type=int, default=3)
+    fingerprints_parser.add_argument('--seed', type=int, default=0)
+    fingerprints_parser.add_argument('--out', default='fingerprint-results.json')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        return run(args)
+    if args.command == 'compare':
+        return compare(args)
+    if args.command == 'fingerprints':
+        return fingerprints_bench(args)
+    return generate(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,176 @@
+"""
+Lectura rápida de imágenes ancladas en un .xlsx.
+
+En lugar de cargar el libro completo con openpyxl, se leen directamente las
+partes del paquete (workbook.xml, relaciones y el dibujo de la hoja activa)
+para construir el índice fila -> imagen. Después basta con recorrer en modo
+read-only solo las filas que tienen imagen.
+"""
+import os
+import posixpath
+import shutil
+import subprocess
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+
+NS = {
+    'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    'rel': 'http://schemas.openxmlformats.org/package/2006/relationships',
+    'xdr': 'http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing',
+    'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+}
+R_ID = f"{{{NS['r']}}}id"
+R_EMBED = f"{{{NS['r']}}}embed"
+
+
+class ImageAnchor:
+    """
+    Imagen anclada a una celda: fila (1-based) y ruta del archivo dentro del zip
+    """
+    __slots__ = ('row', 'col', 'media_path')
+
+    def __init__(self, row, col, media_path):
+        self.row = row
+        self.col = col
+        self.media_path = media_path
+
+
+def _rels_path(part):
+    folder, name = posixpath.split(part)
+    return posixpath.join(folder, '_rels', f"{name}.rels")
+
+
+def _resolve(part, target):
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(part), target))
+
+
+def _read_rels(archive, part):
+    """
+    Relaciones de una parte: {id: (tipo, ruta)}
+    """
+    path = _rels_path(part)
+    if path not in archive.namelist():
+        return {}
+    root = ET.fromstring(archive.read(path))
+    rels = {}
+    for rel in root.findall('rel:Relationship', NS):
+        if rel.get('TargetMode') == 'External':
+            continue
+        rels[rel.get('Id')] = (rel.get('Type', ''), _resolve(part, rel.get('Target', '')))
+    return rels
+
+
+def _workbook_part(archive):
+    root = ET.fromstring(archive.read('_rels/.rels'))
+    for rel in root.findall('rel:Relationship', NS):
+        if rel.get('Type', '').endswith('/officeDocument'):
+            return rel.get('Target').lstrip('/')
+    return 'xl/workbook.xml'
+
+
+def _active_sheet_part(archive):
+    """
+    Ruta de la hoja activa (mismo criterio que openpyxl: activeTab o la primera)
+    """
+    workbook_part = _workbook_part(archive)
+    root = ET.fromstring(archive.read(workbook_part))
+
+    active_index = 0
+    view = root.find('main:bookViews/main:workbookView', NS)
+    if view is not None:
+        active_index = int(view.get('activeTab', 0))
+
+    sheets = root.findall('main:sheets/main:sheet', NS)
+    if not sheets:
+        return None
+    sheet = sheets[active_index] if active_index < len(sheets) else sheets[0]
+    rels = _read_rels(archive, workbook_part)
+    rel = rels.get(sheet.get(R_ID))
+    return rel[1] if rel else None
+
+
+def _picture(anchor):
+    pic = anchor.find('xdr:pic', NS)
+    if pic is None:
+        pic = anchor.find('xdr:grpSp/xdr:pic', NS)
+    return pic
+
+
+def read_image_anchors(path):
+    """
+    Imágenes de la hoja activa en el mismo orden en que openpyxl las carga
+    (anclas absolutas, de una celda y de dos celdas). Las anclas absolutas no
+    tienen fila, así que se omiten.
+    """
+    anchors = []
+    with zipfile.ZipFile(path) as archive:
+        sheet_part = _active_sheet_part(archive)
+        if sheet_part is None:
+            return anchors
+
+        for rel_type, drawing_part in _read_rels(archive, sheet_part).values():
+            if not rel_type.endswith('/drawing'):
+                continue
+            drawing = ET.fromstring(archive.read(drawing_part))
+            drawing_rels = _read_rels(archive, drawing_part)
+
+            for tag in ('oneCellAnchor', 'twoCellAnchor'):
+                for anchor in drawing.findall(f"xdr:{tag}", NS):
+                    pic = _picture(anchor)
+                    if pic is None:
+                        continue
+                    blip = pic.find('xdr:blipFill/a:blip', NS)
+                    if blip is None or not blip.get(R_EMBED):
+                        continue
+                    rel = drawing_rels.get(blip.get(R_EMBED))
+                    if rel is None or not rel[0].endswith('/image'):
+                        continue
+                    start = anchor.find('xdr:from', NS)
+                    row = int(start.find('xdr:row', NS).text) + 1
+                    col = int(start.find('xdr:col', NS).text) + 1
+                    anchors.append(ImageAnchor(row, col, rel[1]))
+    return anchors
+
+
+def read_anchor_images(path, anchors):
+    """
+    Genera (ancla, bytes) abriendo el zip una sola vez
+    """
+    with zipfile.ZipFile(path) as archive:
+        for anchor in anchors:
+            yield anchor, archive.read(anchor.media_path)
+
+
+def xls_converter():
+    """
+    Ejecutable de LibreOffice disponible para convertir .xls, o None
+    """
+    return shutil.which('soffice') or shutil.which('libreoffice')
+
+
+def convert_xls_to_xlsx(path, timeout=120):
+    """
+    Convierte un .xls a .xlsx con LibreOffice en modo headless.
+    Devuelve la ruta del .xlsx (en un directorio temporal) o None.
+    """
+    converter = xls_converter()
+    if converter is None:
+        return None
+    out_dir = tempfile.mkdtemp(prefix='catalog-xls-')
+    try:
+        subprocess.run(
+            [converter, '--headless', '--convert-to', 'xlsx', '--outdir', out_dir, path],
+            check=True, timeout=timeout, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+    except (OSError, subprocess.SubprocessError):
+        shutil.rmtree(out_dir, ignore_errors=True)
+        return None
+    converted = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0] + '.xlsx')
+    if not os.path.exists(converted):
+        shutil.rmtree(out_dir, ignore_errors=True)
+        return None
+    return converted
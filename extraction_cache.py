@@ -0,0 +1,154 @@
+"""
+Caché persistente de resultados de extracción, direccionada por contenido.
+
+Cada entrada guarda la lista de productos extraída de un archivo, con una
+llave derivada del digest del archivo y de la configuración del extractor.
+Si cambia el tamaño de imagen, el tamaño del hash o la versión del
+extractor, la llave cambia y las entradas viejas simplemente dejan de usarse
+hasta que el desalojo LRU las elimina.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class ExtractionCache:
+    """
+    Caché en disco con desalojo LRU limitado por tamaño total en bytes.
+
+    El directorio se comparte entre workers de gunicorn y procesos del pool:
+    el orden LRU es la fecha de modificación de cada archivo, y antes de
+    desalojar se vuelve a leer el directorio, así que el límite cuenta
+    también lo que escribieron los demás procesos.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # llave -> tamaño en bytes (más antiguo primero)
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(content_digest, settings):
+        """
+        Combina el digest del archivo con la configuración del extractor
+        """
+        settings_json = json.dumps(settings, sort_keys=True)
+        return hashlib.sha256(f"{content_digest}:{settings_json}".encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        self._rescan()
+        self._evict()
+
+    def _rescan(self):
+        # Reconstruir el orden LRU a partir de la fecha de modificación
+        found = []
+        for root, _dirs, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                found.append((st.st_mtime, name[:-5], st.st_size))
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        for _mtime, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def get(self, key):
+        """
+        Devuelve la lista de productos guardada o None si no existe
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as fh:
+                products = json.load(fh)
+            os.utime(path)  # Marcar como usado recientemente (persiste el orden LRU)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+                size = self._entries.pop(key, None)
+                if size is not None:
+                    self._total_bytes -= size
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                # Escrita por otro worker que comparte el directorio
+                size = os.path.getsize(path)
+                self._entries[key] = size
+                self._total_bytes += size
+        return products
+
+    def put(self, key, products):
+        """
+        Guarda la lista de productos de forma atómica y desaloja si hace falta
+        """
+        data = json.dumps(products, ensure_ascii=False).encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self.stores += 1
+            # Otros procesos también escriben y usan entradas: el tamaño y el
+            # orden LRU salen del directorio, no solo de lo visto aquí
+            self._rescan()
+            self._evict()
+
+    def _evict(self):
+        # Se llama con el lock tomado (o durante la inicialización)
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 3) if lookups else 0,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'sizeBytes': self._total_bytes,
+                'maxBytes': self.max_bytes,
+            }
@@ -0,0 +1,170 @@
+"""
+Huellas de imagen intercambiables para agrupar productos.
+
+Todas parten de la misma matriz de grises de 32x32 que prepara PhashEngine
+(la imagen se decodifica una sola vez) y producen palabras de 64 bits
+(uint64), que se guardan como hexadecimal de ancho fijo (16 caracteres por
+palabra) en image_hash:
+
+- phash: DCT + mediana, idéntico a PhashEngine (imagehash.phash).
+- dhash: gradiente horizontal sobre una rejilla de 9x8.
+- ahash: promedio sobre una rejilla de 8x8; muy barato, sirve de prefiltro.
+- composite: ahash, phash y dhash en una sola llave de 192 bits. En modo
+  similar los candidatos salen del índice sobre el ahash (umbral propio) y
+  se confirman con phash + dhash (grouping.cluster_cascade).
+"""
+import numpy
+
+WORD_BITS = 64
+GRID = 8  # Rejilla de ahash/dhash (8x8 = 64 bits)
+
+
+class FingerprintBackend:
+    """
+    Interfaz: name, words (palabras de 64 bits) y compute(pixels), que
+    recibe un arreglo (N, 32, 32) de grises y devuelve (N, words) uint64
+    """
+
+    name = None
+    words = 1
+
+    def compute(self, pixels):
+        raise NotImplementedError
+
+    @property
+    def bits(self):
+        return self.words * WORD_BITS
+
+
+class AverageHash(FingerprintBackend):
+    name = 'ahash'
+
+    def compute(self, pixels):
+        n, size, _ = pixels.shape
+        block = size // GRID
+        cells = pixels.reshape(n, GRID, block, GRID, block).mean(axis=(2, 4))
+        bits = cells > cells.mean(axis=(1, 2))[:, None, None]
+        return pack_words(bits.reshape(n, -1))
+
+
+class DifferenceHash(FingerprintBackend):
+    name = 'dhash'
+
+    def compute(self, pixels):
+        n, size, _ = pixels.shape
+        pixels = pixels.astype(numpy.float64)
+        rows = pixels.reshape(n, GRID, size // GRID, size).mean(axis=2)
+        # 9 columnas (anchos de 3 o 4 px) para 8 diferencias por fila
+        edges = numpy.linspace(0, size, GRID + 2).astype(int)[:-1]
+        widths = numpy.diff(numpy.append(edges, size))
+        columns = numpy.add.reduceat(rows, edges, axis=2) / widths
+        bits = columns[:, :, 1:] > columns[:, :, :-1]
+        return pack_words(bits.reshape(n, -1))
+
+
+class PerceptualHash(FingerprintBackend):
+    name = 'phash'
+
+    def __init__(self, phash_engine):
+        self.phash_engine = phash_engine
+
+    def compute(self, pixels):
+        return pack_words(self.phash_engine.hash_bits(pixels))
+
+
+class CompositeHash(FingerprintBackend):
+    """
+    [ahash | phash | dhash]: la primera palabra es el prefiltro
+    """
+    name = 'composite'
+
+    def __init__(self, phash_engine):
+        self.parts = (AverageHash(), PerceptualHash(phash_engine), DifferenceHash())
+        self.words = len(self.parts)
+
+    def compute(self, pixels):
+        return numpy.hstack([part.compute(pixels) for part in self.parts])
+
+
+FINGERPRINT_BACKENDS = ('phash', 'dhash', 'ahash', 'composite')
+
+
+def make_backend(name, phash_engine):
+    if name == 'phash':
+        return PerceptualHash(phash_engine)
+    if name == 'dhash':
+        return DifferenceHash()
+    if name == 'ahash':
+        return AverageHash()
+    if name == 'composite':
+        return CompositeHash(phash_engine)
+    raise ValueError(f"Huella de imagen desconocida: {name}")
+
+
+class FingerprintEngine:
+    """
+    Misma interfaz que PhashEngine (hash_many, hash_one, version, bits) con
+    otra huella. Decodifica con el PhashEngine, así que exact/fast también
+    cambian el resultado y forman parte de la versión.
+    """
+
+    def __init__(self, backend, phash_engine):
+        if phash_engine.hash_size * phash_engine.hash_size != WORD_BITS:
+            raise ValueError('Las huellas requieren HASH_SIZE = 8')
+        self.backend = backend
+        self.phash_engine = phash_engine
+
+    @property
+    def version(self):
+        return f"{self.backend.name}-v1.{self.phash_engine.engine}"
+
+    @property
+    def bits(self):
+        return self.backend.bits
+
+    def fingerprints(self, arrays):
+        """
+        Huellas (N, words) uint64 de un lote de matrices de grises
+        """
+        if not arrays:
+            return numpy.empty((0, self.backend.words), dtype=numpy.uint64)
+        return self.backend.compute(numpy.stack(arrays))
+
+    def hash_arrays(self, arrays):
+        return words_to_hex(self.fingerprints(arrays))
+
+    def hash_many(self, images_bytes, stage=None):
+        return self.phash_engine.hash_many(images_bytes, stage=stage, hash_arrays=self.hash_arrays)
+
+    def hash_one(self, image_bytes):
+        return self.hash_arrays([self.phash_engine.prepare(image_bytes)])[0]
+
+
+def make_engine(name, phash_engine):
+    """
+    Motor de hash para la huella indicada; 'phash' es el PhashEngine tal cual
+    (mismos hashes y misma versión de caché que antes)
+    """
+    if name == 'phash':
+        return phash_engine
+    return FingerprintEngine(make_backend(name, phash_engine), phash_engine)
+
+
+def pack_words(bits):
+    """
+    Matriz (N, 64 * k) de booleanos -> (N, k) uint64, el primer bit es el más
+    significativo (el mismo orden que el hexadecimal de imagehash)
+    """
+    packed = numpy.packbits(bits, axis=1)
+    return packed.view('>u8').astype(numpy.uint64)
+
+
+def words_to_hex(words):
+    return [''.join(f'{word:016x}' for word in row) for row in words.tolist()]
+
+
+def hex_to_words(image_hash):
+    """
+    Hexadecimal de ancho fijo -> palabras de 64 bits (enteros de Python)
+    """
+    return [int(image_hash[i:i + 16], 16) for i in range(0, len(image_hash), 16)]
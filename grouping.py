@@ -0,0 +1,254 @@
+"""
+Agrupación de productos por hash de imagen.
+
+- exact: solo une productos con el mismo hash (comportamiento original)
+- similar: une productos cuyos hashes están a distancia de Hamming <= umbral,
+  usando un índice multi-index hashing y union-find, de modo que no se
+  compara cada par de productos (el umbral va de 0 a MAX_THRESHOLD). Con
+  bloques de ~log2(n) bits cada consulta revisa unos n / 2^16 candidatos, así
+  que el costo es casi lineal hasta ~100 000 hashes únicos y después vuelve a
+  acercarse a cuadrático. El BK-tree queda solo para comparar en
+  entradas chicas: con 64 bits y umbral 6 visita casi todo el árbol y el
+  costo total crece de forma cuadrática.
+
+Con huellas compuestas (fingerprints.CompositeHash) la primera palabra de 64
+bits es un prefiltro barato: el índice solo busca sobre ella y los
+candidatos se confirman con el resto de las palabras (cluster_cascade).
+"""
+import math
+from collections import defaultdict
+from itertools import combinations
+
+GROUPING_MODES = ('exact', 'similar')
+INDEX_TYPES = ('mih', 'bktree')
+# Umbral máximo aceptado: más arriba casi todo se vuelve vecino y el costo
+# de la búsqueda crece muy rápido (hashes de 64 bits)
+MAX_THRESHOLD = 16
+WORD_BITS = 64
+
+
+def hash_to_int(image_hash):
+    """
+    Convierte el hash hexadecimal de imagehash a entero
+    """
+    return int(image_hash, 16)
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    Árbol BK sobre la distancia de Hamming. Solo para comparar con
+    MultiIndexHash en entradas chicas (no escala a 100 000+ hashes)
+    """
+
+    def __init__(self):
+        self.root = None  # Nodo: (valor, {distancia: nodo hijo})
+
+    def add(self, value):
+        if self.root is None:
+            self.root = (value, {})
+            return
+        node = self.root
+        while True:
+            dist = hamming(value, node[0])
+            if dist == 0:
+                return
+            child = node[1].get(dist)
+            if child is None:
+                node[1][dist] = (value, {})
+                return
+            node = child
+
+    def search(self, value, threshold):
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node_value, children = stack.pop()
+            dist = hamming(value, node_value)
+            if dist <= threshold:
+                found.append(node_value)
+            # Desigualdad triangular: solo ramas con |d - dist| <= umbral
+            for child_dist, child in children.items():
+                if dist - threshold <= child_dist <= dist + threshold:
+                    stack.append(child)
+        return found
+
+
+class MultiIndexHash:
+    """
+    Multi-index hashing: divide el hash en m bloques de bits y busca en cada
+    tabla los bloques a distancia <= umbral // m del bloque consultado. Por
+    el principio del palomar, dos hashes a distancia <= umbral están a esa
+    distancia en al menos un bloque.
+
+    m se elige según el número de hashes (size): bloques de ~log2(size) bits
+    dejan pocos candidatos por cubeta sin multiplicar los vecinos a probar
+    (p. ej. 4 bloques de 16 bits y radio 1 con 100 000 hashes y umbral 6).
+    """
+
+    def __init__(self, bits, threshold, size=None):
+        if not 0 <= threshold < bits:
+            raise ValueError(f"Umbral fuera de rango para {bits} bits: {threshold}")
+        self.threshold = threshold
+        num_chunks = self._best_num_chunks(bits, threshold, size)
+        self.radius = threshold // num_chunks
+        base, extra = divmod(bits, num_chunks)
+        self.chunks = []  # (desplazamiento, máscara, XOR de los vecinos a probar)
+        shift = 0
+        for i in range(num_chunks):
+            width = base + (1 if i < extra else 0)
+            self.chunks.append((shift, (1 << width) - 1, _flip_masks(width, self.radius)))
+            shift += width
+        self.tables = [defaultdict(list) for _ in self.chunks]
+
+    @staticmethod
+    def _best_num_chunks(bits, threshold, size):
+        """
+        Número de bloques con menor costo estimado por consulta:
+        vecinos probados x (1 + candidatos esperados por cubeta)
+        """
+        if not size:
+            return threshold + 1  # Sin tamaño: bloques exactos (radio 0)
+        best, best_cost = threshold + 1, None
+        for num_chunks in range(1, threshold + 2):
+            width = bits // num_chunks
+            probes = sum(math.comb(width, k) for k in range(threshold // num_chunks + 1))
+            cost = num_chunks * probes * (1 + size / 2 ** width)
+            if best_cost is None or cost < best_cost:
+                best, best_cost = num_chunks, cost
+        return best
+
+    def add(self, value):
+        for (shift, mask, _flips), table in zip(self.chunks, self.tables):
+            table[(value >> shift) & mask].append(value)
+
+    def search(self, value, threshold):
+        found = set()
+        for (shift, mask, flips), table in zip(self.chunks, self.tables):
+            key = (value >> shift) & mask
+            get = table.get
+            for flip in flips:
+                bucket = get(key ^ flip)
+                if bucket is None:
+                    continue
+                for candidate in bucket:
+                    if (value ^ candidate).bit_count() <= threshold:
+                        found.add(candidate)
+        return list(found)
+
+
+def _flip_masks(width, radius):
+    """
+    Máscaras XOR de todos los valores a distancia <= radius en `width` bits
+    """
+    return [
+        sum(1 << bit for bit in flipped)
+        for k in range(radius + 1)
+        for flipped in combinations(range(width), k)
+    ]
+
+
+class UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, i):
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        # Compresión de camino
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            # El representante es siempre el de menor índice (orden estable)
+            if root_b < root_a:
+                root_a, root_b = root_b, root_a
+            self.parent[root_b] = root_a
+
+
+def _make_index(index, bits, threshold, size=None):
+    if index not in INDEX_TYPES:
+        raise ValueError(f"Índice de agrupación desconocido: {index}")
+    return BKTree() if index == 'bktree' else MultiIndexHash(bits, threshold, size)
+
+
+def cluster_hashes(hashes, threshold, bits=64, index='mih', prefilter_threshold=None):
+    """
+    Agrupa hashes enteros únicos a distancia <= umbral (clausura transitiva).
+    Devuelve una lista con el índice de grupo de cada hash. Con
+    prefilter_threshold los hashes son compuestos (ver cluster_cascade).
+    """
+    if prefilter_threshold is not None and bits > WORD_BITS:
+        return cluster_cascade(hashes, threshold, prefilter_threshold, bits // WORD_BITS, index=index)
+
+    tree = _make_index(index, bits, threshold, len(hashes))
+    position = {value: i for i, value in enumerate(hashes)}
+    uf = UnionFind(len(hashes))
+    for i, value in enumerate(hashes):
+        for neighbor in tree.search(value, threshold):
+            uf.union(i, position[neighbor])
+        tree.add(value)
+
+    return [uf.find(i) for i in range(len(hashes))]
+
+
+def cluster_cascade(hashes, threshold, prefilter_threshold, words, index='mih'):
+    """
+    Hashes de `words` palabras de 64 bits: la primera (la más significativa)
+    es el prefiltro. Los candidatos de cada hash son los que tienen el
+    prefiltro a distancia <= prefilter_threshold (índice sobre 64 bits) y se
+    unen si la distancia sumada de las demás palabras es <= umbral por palabra.
+    """
+    shift = WORD_BITS * (words - 1)
+    rest_mask = (1 << shift) - 1
+    max_distance = threshold * (words - 1)
+    tree = _make_index(index, WORD_BITS, prefilter_threshold, len(hashes))
+
+    by_prefilter = defaultdict(list)  # prefiltro -> posiciones de los hashes con ese prefiltro
+    uf = UnionFind(len(hashes))
+    for i, value in enumerate(hashes):
+        prefilter, rest = value >> shift, value & rest_mask
+        for neighbor in tree.search(prefilter, prefilter_threshold):
+            for j in by_prefilter[neighbor]:
+                if hamming(rest, hashes[j] & rest_mask) <= max_distance:
+                    uf.union(i, j)
+        if prefilter not in by_prefilter:
+            tree.add(prefilter)
+        by_prefilter[prefilter].append(i)
+
+    return [uf.find(i) for i in range(len(hashes))]
+
+
+def group_products(products, mode='exact', threshold=0, bits=64, index='mih', prefilter_threshold=None):
+    """
+    Agrupa productos por imagen. Devuelve listas de productos en orden de
+    primera aparición; dentro de cada grupo se conserva el orden original.
+    """
+    if mode == 'exact' or threshold <= 0:
+        groups = defaultdict(list)
+        for product in products:
+            groups[product['image_hash']].append(product)
+        return list(groups.values())
+
+    # Hashes únicos en orden de primera aparición
+    unique = {}
+    for product in products:
+        unique.setdefault(hash_to_int(product['image_hash']), len(unique))
+    hashes = list(unique)
+    labels = cluster_hashes(hashes, threshold, bits=bits, index=index, prefilter_threshold=prefilter_threshold)
+
+    groups = {}
+    for product in products:
+        label = labels[unique[hash_to_int(product['image_hash'])]]
+        groups.setdefault(label, []).append(product)
+    return list(groups.values())
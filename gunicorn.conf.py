@@ -0,0 +1,59 @@
+"""
+Configuración de gunicorn para producción (gunicorn -c gunicorn.conf.py).
+
+La app se importa y se calienta en el master (preload_app) y los workers se
+crean con fork, así que todos comparten las bibliotecas ya cargadas. El pool
+de procesos de EXECUTION_MODE=process y los hilos de trabajos se crean
+dentro de cada worker al primer uso.
+
+Como cualquier worker puede atender cualquier petición, aquí se cambian los
+defaults del estado que en `python main.py` vive en el proceso (solo si no
+se configuraron explícitamente): trabajos y resultados en SQLite, métricas
+sumadas desde METRICS_DIR y el pool de procesos repartido entre los workers.
+"""
+import glob
+import os
+import tempfile
+
+port = os.environ.get('PORT', 5000)
+wsgi_app = 'wsgi:app'
+bind = f"0.0.0.0:{port}"
+
+# La extracción usa CPU: por default un worker por CPU
+workers = int(os.environ.get('GUNICORN_WORKERS', os.cpu_count() or 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Estado compartido entre workers (main lee estas variables al importarse)
+os.environ.setdefault('JOB_STORE', 'sqlite')
+os.environ.setdefault('RESULT_STORE', 'sqlite')
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), f"catalog-api-metrics-{port}"))
+# Cada worker crea su propio pool en modo process: repartir las CPUs
+os.environ.setdefault('MAX_WORKERS', str(max(1, (os.cpu_count() or 1) // workers)))
+
+preload_app = True
+
+# Catálogos grandes pueden tardar minutos en una sola petición
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
+graceful_timeout = 30
+keepalive = 5
+
+# Reciclar workers cada N peticiones (0 = nunca) para acotar la fragmentación de memoria
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+def on_starting(server):
+    # Los contadores empiezan de cero en cada arranque del master
+    directory = os.environ.get('METRICS_DIR')
+    if not directory:
+        return
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
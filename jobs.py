@@ -0,0 +1,320 @@
+"""
+Trabajos asíncronos de consolidación.
+
+Un POST crea el trabajo y devuelve su id de inmediato; el procesamiento
+corre en una cola acotada de hilos en segundo plano y el cliente consulta el
+progreso (por archivo y por página) y luego los resultados. El estado y los
+resultados viven detrás de un JobStore intercambiable.
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+logger = logging.getLogger('catalog.jobs')
+
+
+def new_job(filenames, options=None):
+    """
+    Estado inicial de un trabajo
+    """
+    return {
+        'id': uuid.uuid4().hex,
+        'status': JOB_QUEUED,
+        'createdAt': time.time(),
+        'startedAt': None,
+        'finishedAt': None,
+        'error': None,
+        'options': options or {},
+        'files': [
+            {'name': name, 'status': JOB_QUEUED, 'pagesDone': 0, 'pagesTotal': None, 'products': None}
+            for name in filenames
+        ],
+    }
+
+
+def process_token(pid=None):
+    """
+    Identifica un proceso: pid y, en Linux, su hora de inicio (así un pid
+    reutilizado por otro proceso no pasa por el dueño original)
+    """
+    pid = pid or os.getpid()
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as fh:
+            started = fh.read().rsplit(')', 1)[1].split()[19]
+    except (OSError, IndexError):
+        started = ''
+    return f"{pid}:{started}"
+
+
+def process_alive(token):
+    """
+    Si el proceso de process_token() sigue corriendo (en esta máquina)
+    """
+    pid = int(token.split(':', 1)[0])
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    current = process_token(pid)
+    # Sin /proc no hay hora de inicio: basta con que el pid exista
+    return current == token or current.endswith(':')
+
+
+class JobStore:
+    """
+    Interfaz de almacenamiento de trabajos
+    """
+
+    def create(self, job):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def update(self, job_id, **fields):
+        raise NotImplementedError
+
+    def update_file(self, job_id, file_index, **fields):
+        raise NotImplementedError
+
+    def set_result(self, job_id, result):
+        raise NotImplementedError
+
+    def get_result(self, job_id):
+        raise NotImplementedError
+
+    def purge(self, older_than):
+        """
+        Elimina trabajos terminados antes de la fecha indicada (timestamp)
+        """
+        raise NotImplementedError
+
+    def unfinished(self):
+        """
+        Ids de los trabajos que no han terminado
+        """
+        raise NotImplementedError
+
+
+class MemoryJobStore(JobStore):
+    """
+    Trabajos en memoria del proceso (se pierden al reiniciar)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._results = {}
+
+    def create(self, job):
+        with self._lock:
+            self._jobs[job['id']] = job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job is not None else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def update_file(self, job_id, file_index, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id]['files'][file_index].update(fields)
+
+    def set_result(self, job_id, result):
+        with self._lock:
+            self._results[job_id] = result
+
+    def get_result(self, job_id):
+        with self._lock:
+            return self._results.get(job_id)
+
+    def purge(self, older_than):
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job['finishedAt'] is not None and job['finishedAt'] < older_than
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+                self._results.pop(job_id, None)
+        return len(expired)
+
+    def unfinished(self):
+        with self._lock:
+            return [job_id for job_id, job in self._jobs.items() if job['finishedAt'] is None]
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Trabajos en SQLite; sobrevive reinicios y se comparte entre workers
+    de gunicorn (la cola de procesamiento sigue siendo por proceso)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id TEXT PRIMARY KEY,'
+                ' state TEXT NOT NULL,'
+                ' result TEXT,'
+                ' finished_at REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create(self, job):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, state, finished_at) VALUES (?, ?, ?)',
+                (job['id'], json.dumps(job), job['finishedAt']),
+            )
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT state FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _modify(self, job_id, change):
+        # Leer-modificar-escribir dentro de una transacción inmediata
+        with self._lock, self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT state FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if not row:
+                return
+            job = json.loads(row[0])
+            change(job)
+            conn.execute(
+                'UPDATE jobs SET state = ?, finished_at = ? WHERE id = ?',
+                (json.dumps(job), job['finishedAt'], job_id),
+            )
+
+    def update(self, job_id, **fields):
+        self._modify(job_id, lambda job: job.update(fields))
+
+    def update_file(self, job_id, file_index, **fields):
+        self._modify(job_id, lambda job: job['files'][file_index].update(fields))
+
+    def set_result(self, job_id, result):
+        with self._lock, self._connect() as conn:
+            conn.execute('UPDATE jobs SET result = ? WHERE id = ?', (json.dumps(result), job_id))
+
+    def get_result(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT result FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def purge(self, older_than):
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                'DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?',
+                (older_than,),
+            )
+            return cursor.rowcount
+
+    def unfinished(self):
+        with self._connect() as conn:
+            rows = conn.execute('SELECT id FROM jobs WHERE finished_at IS NULL').fetchall()
+        return [row[0] for row in rows]
+
+
+class JobQueue:
+    """
+    Cola acotada con hilos de trabajo. Los hilos se crean al primer envío,
+    así un master de gunicorn con preload no los hereda al hacer fork.
+    """
+
+    def __init__(self, store, runner, workers=1, max_pending=16):
+        self.store = store
+        self.runner = runner  # runner(job_id, payload) -> resultado serializable
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, job, payload):
+        """
+        Encola un trabajo. Lanza queue.Full si la cola está llena.
+        """
+        self._ensure_started()
+        job['owner'] = process_token()  # Proceso cuya cola lo va a procesar
+        self.store.create(job)
+        try:
+            self._queue.put_nowait((job['id'], payload))
+        except queue.Full:
+            self.store.update(job['id'], status=JOB_FAILED, error='Cola llena', finishedAt=time.time())
+            raise
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def get(self, job_id):
+        """
+        Estado del trabajo. Si sigue en cola o corriendo pero el proceso
+        dueño ya terminó (worker reciclado, timeout o caída), nadie lo va a
+        terminar: se marca como fallido.
+        """
+        job = self.store.get(job_id)
+        if job is None or job['status'] not in (JOB_QUEUED, JOB_RUNNING):
+            return job
+        owner = job.get('owner')
+        if owner is None or process_alive(owner):
+            return job
+        logger.warning(f"⚠️ Trabajo {job_id} sin proceso (terminó el worker {owner.split(':')[0]})")
+        self.store.update(
+            job_id, status=JOB_FAILED, finishedAt=time.time(),
+            error='El proceso que atendía el trabajo terminó; vuelve a enviarlo',
+        )
+        return self.store.get(job_id)
+
+    def fail_orphans(self):
+        """
+        Marca como fallidos los trabajos sin terminar cuyo proceso ya no existe
+        (así purge() también los puede eliminar después)
+        """
+        for job_id in self.store.unfinished():
+            self.get(job_id)
+
+    def _work(self):
+        while True:
+            job_id, payload = self._queue.get()
+            try:
+                self.store.update(job_id, status=JOB_RUNNING, startedAt=time.time())
+                result = self.runner(job_id, payload)
+                self.store.set_result(job_id, result)
+                self.store.update(job_id, status=JOB_DONE, finishedAt=time.time())
+            except Exception as e:
+                logger.exception(f"❌ Error en trabajo {job_id}: {e}")
+                self.store.update(job_id, status=JOB_FAILED, error=str(e), finishedAt=time.time())
+            finally:
+                self._queue.task_done()
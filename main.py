@@ -1,84 +1,436 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
-from PIL import Image
-import imagehash
 import io
+import itertools
+import json
+import logging
 import re
 import fitz  # PyMuPDF
-from collections import defaultdict
+import hashlib
+import math
+import queue
+import shutil
+import time
+from bisect import bisect_left, bisect_right
+import multiprocessing
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict, defaultdict
 import gc  # Garbage collector
+from openpyxl import Workbook, load_workbook
+from PIL import Image
+from excel_fast import convert_xls_to_xlsx, read_anchor_images, read_image_anchors
+from extraction_cache import ExtractionCache
+from fingerprints import make_engine as make_fingerprint_engine
+from hashing import PhashEngine
+from grouping import GROUPING_MODES, INDEX_TYPES, MAX_THRESHOLD, group_products
+from marketing import MARKETING_FIELDS, parse_marketing_fields, render_marketing
+from memory import PeakMemoryMonitor, rss_bytes
+from metrics import Metrics
+from product_store import ProductStore
+from product_table import MAX_HASH_BITS, ProductTable
+from result_sets import ResultCache, ResultQuery, ResultSet, SQLiteResultCache
+from rules import RuleEngine
+from jobs import JOB_DONE, JOB_FAILED, JobQueue, MemoryJobStore, SQLiteJobStore, new_job
+from werkzeug.datastructures import FileStorage
 
 app = Flask(__name__)
 CORS(app)
 
+# Nivel de los mensajes de consola (DEBUG incluye una línea por página e imagen)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(level=LOG_LEVEL, format='%(message)s')
+logger = logging.getLogger('catalog')
+
+# Tiempos por etapa y contadores (GET /metrics). Con METRICS_DIR cada proceso
+# web publica ahí sus contadores y /metrics devuelve la suma de todos
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+metrics = Metrics('catalog', directory=METRICS_DIR or None)
+
 # Configuración para optimizar memoria
 MAX_IMAGE_SIZE = (800, 800)  # Reducir imágenes a máximo 800x800px
 HASH_SIZE = 8  # Tamaño del hash perceptual
+ROW_TOLERANCE = 50  # Distancia vertical máxima (puntos) entre imagen y texto de la misma fila
+PRICE_PATTERN = re.compile(r'\b(\d{2,4})\b')
+
+# Reglas de cabeceras, categorías y MOQ (generales y por proveedor)
+RULES_PATH = os.environ.get('RULES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json'))
+rule_engine = RuleEngine.from_file(RULES_PATH)
+
+# Caché de extracciones por contenido (0 MB desactiva la caché)
+# Subir EXTRACTOR_VERSION cada vez que cambie la lógica de extracción
+EXTRACTOR_VERSION = '1'
+EXTRACTION_CACHE_DIR = os.environ.get(
+    'EXTRACTION_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'catalog-api-cache')
+)
+EXTRACTION_CACHE_MAX_MB = int(os.environ.get('EXTRACTION_CACHE_MAX_MB', 512))
+
+extraction_cache = (
+    ExtractionCache(EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_MB * 1024 * 1024)
+    if EXTRACTION_CACHE_MAX_MB > 0 else None
+)
+
+# Motor de Excel: 'fast' (índice de anclas + lectura read-only) u 'openpyxl' (libro completo)
+EXCEL_ENGINE = os.environ.get('EXCEL_ENGINE', 'fast').lower()
+EXCEL_ENGINES = ('fast', 'openpyxl')
+if EXCEL_ENGINE not in EXCEL_ENGINES:
+    raise ValueError(f"EXCEL_ENGINE inválido: {EXCEL_ENGINE}")
+
+# Modo de ejecución: 'sequential' (un archivo y una página a la vez) o 'process'
+# (pool de procesos que reparte archivos y rangos de páginas entre workers)
+EXECUTION_MODE = os.environ.get('EXECUTION_MODE', 'sequential').lower()
+EXECUTION_MODES = ('sequential', 'process')
+if EXECUTION_MODE not in EXECUTION_MODES:
+    raise ValueError(f"EXECUTION_MODE inválido: {EXECUTION_MODE}")
+MAX_WORKERS = max(1, int(os.environ.get('MAX_WORKERS', os.cpu_count() or 1)))
+POOL_CHUNKS_PER_WORKER = 2  # Más partes que workers para balancear la carga
+POOL_CHUNK_MAX_MB = int(os.environ.get('POOL_CHUNK_MAX_MB', 64))  # Datos de PDF por parte
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+# Las subidas se copian por bloques a archivos temporales y los extractores
+# abren el archivo desde disco (nunca se lee el archivo completo en memoria)
+SPOOL_DIR = os.environ.get('SPOOL_DIR') or None  # None = directorio temporal del sistema
+SPOOL_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', 0))  # 0 = sin límite
+if MAX_UPLOAD_MB > 0:
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
+
+# Memo de hashes entre documentos, por digest de los bytes de la imagen (0 lo desactiva)
+IMAGE_HASH_MEMO_SIZE = int(os.environ.get('IMAGE_HASH_MEMO_SIZE', 4096))
+# Imágenes que se repiten en al menos N páginas de un PDF se consideran
+# decorativas (logos, sellos de "agotado") y se ignoran. 0 lo desactiva.
+DECORATIVE_IMAGE_MIN_PAGES = int(os.environ.get('DECORATIVE_IMAGE_MIN_PAGES', 0))
+
+# Triage de páginas antes de decodificar y hashear imágenes:
+# 'off', 'safe' (solo salta páginas sin ningún número tipo precio fuera de
+# cabeceras, que no pueden dar productos), 'on' (además heurísticas de
+# portadas/banners y páginas de texto) o 'dry-run' (clasifica sin saltar)
+PAGE_TRIAGE = os.environ.get('PAGE_TRIAGE', 'safe').lower()
+TRIAGE_MODES = ('off', 'safe', 'on', 'dry-run')
+if PAGE_TRIAGE not in TRIAGE_MODES:
+    raise ValueError(f"PAGE_TRIAGE inválido: {PAGE_TRIAGE}")
+TRIAGE_BANNER_AREA = float(os.environ.get('TRIAGE_BANNER_AREA', 0.3))  # Fracción de la página
+TRIAGE_TEXT_CHARS = int(os.environ.get('TRIAGE_TEXT_CHARS', 3000))  # Caracteres de una página de texto
+TRIAGE_CHARS_PER_PRICE = 400  # En una cuadrícula hay un precio distinto cada pocas decenas de caracteres
+
+# Agrupación: 'exact' (hash idéntico) o 'similar' (distancia de Hamming <= umbral)
+GROUPING_MODE = os.environ.get('GROUPING_MODE', 'exact').lower()
+if GROUPING_MODE not in GROUPING_MODES:
+    raise ValueError(f"GROUPING_MODE inválido: {GROUPING_MODE}")
+HAMMING_THRESHOLD = int(os.environ.get('HAMMING_THRESHOLD', 6))
+if not 0 <= HAMMING_THRESHOLD <= MAX_THRESHOLD:
+    raise ValueError(f"HAMMING_THRESHOLD fuera de rango (0-{MAX_THRESHOLD}): {HAMMING_THRESHOLD}")
+# Índice de modo similar: 'mih' (multi-index hashing). 'bktree' es solo para
+# comparar en entradas chicas: con 64 bits y umbral 6 crece de forma cuadrática
+# (~26 s con 20 000 hashes contra ~0.2 s de 'mih')
+GROUPING_INDEX = os.environ.get('GROUPING_INDEX', 'mih').lower()
+if GROUPING_INDEX not in INDEX_TYPES:
+    raise ValueError(f"GROUPING_INDEX inválido: {GROUPING_INDEX}")
+if GROUPING_INDEX == 'bktree':
+    logger.warning("⚠️ GROUPING_INDEX=bktree es un modo de comparación para pocos productos; en producción usa 'mih'")
+
+# Consolidación: 'table' (columnas NumPy, sin un dict por producto) o 'dicts'.
+# La tabla guarda los hashes como uint64, así que requiere huellas de 64 bits
+# (con FINGERPRINT=composite se usa 'dicts').
+CONSOLIDATION_ENGINE = os.environ.get('CONSOLIDATION_ENGINE', 'table').lower()
+CONSOLIDATION_ENGINES = ('table', 'dicts')
+if CONSOLIDATION_ENGINE not in CONSOLIDATION_ENGINES:
+    raise ValueError(f"CONSOLIDATION_ENGINE inválido: {CONSOLIDATION_ENGINE}")
+
+# Últimos resultados guardados para paginar/filtrar (GET /api/results/<id>); 0 lo desactiva
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 4))
+# 'memory' (por proceso) o 'sqlite' (compartido entre workers de gunicorn)
+RESULT_STORE = os.environ.get('RESULT_STORE', 'memory').lower()
+STORE_TYPES = ('memory', 'sqlite')
+if RESULT_STORE not in STORE_TYPES:
+    raise ValueError(f"RESULT_STORE inválido: {RESULT_STORE}")
+RESULT_DB_PATH = os.environ.get(
+    'RESULT_DB_PATH', os.path.join(tempfile.gettempdir(), 'catalog-api-results.db')
+)
+RESULT_PAGE_LIMIT = int(os.environ.get('RESULT_PAGE_LIMIT', 50))  # Productos por página por default
+RESULT_PAGE_MAX = int(os.environ.get('RESULT_PAGE_MAX', 1000))  # Máximo de limit
+
+# Trabajos asíncronos: almacenamiento 'memory' o 'sqlite', hilos y tamaño de la cola
+JOB_STORE = os.environ.get('JOB_STORE', 'memory').lower()
+if JOB_STORE not in STORE_TYPES:
+    raise ValueError(f"JOB_STORE inválido: {JOB_STORE}")
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', os.path.join(tempfile.gettempdir(), 'catalog-api-jobs.db'))
+JOB_WORKERS = max(1, int(os.environ.get('JOB_WORKERS', 1)))
+JOB_QUEUE_SIZE = max(1, int(os.environ.get('JOB_QUEUE_SIZE', 16)))
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', 3600))
+
+# Motor de hash: 'exact' (idéntico a imagehash.phash) o 'fast' (decodifica
+# directo a tamaño pequeño; hashes de otra versión, no comparables con 'exact')
+HASH_ENGINE = os.environ.get('HASH_ENGINE', 'exact').lower()
+HASH_BATCH_SIZE = 64  # Imágenes por lote de DCT
+
+# Huella de imagen: 'phash' (default), 'dhash', 'ahash' o 'composite'
+# (ahash como prefiltro + phash y dhash para confirmar en modo similar)
+FINGERPRINT = os.environ.get('FINGERPRINT', 'phash').lower()
+FINGERPRINT_PREFILTER_THRESHOLD = int(os.environ.get('FINGERPRINT_PREFILTER_THRESHOLD', 12))
+if not 0 <= FINGERPRINT_PREFILTER_THRESHOLD <= MAX_THRESHOLD:
+    raise ValueError(
+        f"FINGERPRINT_PREFILTER_THRESHOLD fuera de rango (0-{MAX_THRESHOLD}): {FINGERPRINT_PREFILTER_THRESHOLD}"
+    )
+hash_engine = make_fingerprint_engine(FINGERPRINT, PhashEngine(HASH_ENGINE, HASH_SIZE, MAX_IMAGE_SIZE))
+HASH_BITS = hash_engine.bits  # Bits de cada huella (192 con 'composite')
+PREFILTER_THRESHOLD = FINGERPRINT_PREFILTER_THRESHOLD if FINGERPRINT == 'composite' else None
+
+# Índice persistente de productos para consolidación incremental
+PRODUCT_DB_PATH = os.environ.get(
+    'PRODUCT_DB_PATH', os.path.join(tempfile.gettempdir(), 'catalog-api-products.db')
+)
+
+_image_hash_memo = OrderedDict()
+_image_hash_memo_lock = threading.Lock()
+
+def hash_images_bytes(images_bytes):
+    """
+    Hash perceptual de un lote de imágenes con memo LRU por digest de los
+    bytes crudos, para que la misma foto en varios catálogos se decodifique
+    una sola vez. Devuelve por imagen el hash o la excepción que produjo.
+    """
+    results = [None] * len(images_bytes)
+    digests = [None] * len(images_bytes)
+    missing = []
+    
+    if IMAGE_HASH_MEMO_SIZE > 0:
+        with _image_hash_memo_lock:
+            for i, image_bytes in enumerate(images_bytes):
+                digest = hashlib.sha1(image_bytes).digest()
+                digests[i] = digest
+                img_hash = _image_hash_memo.get(digest)
+                if img_hash is not None:
+                    _image_hash_memo.move_to_end(digest)
+                    results[i] = img_hash
+                else:
+                    missing.append(i)
+    else:
+        missing = list(range(len(images_bytes)))
+    
+    computed = hash_engine.hash_many([images_bytes[i] for i in missing], stage=metrics.stage)
+    
+    with _image_hash_memo_lock:
+        for i, img_hash in zip(missing, computed):
+            results[i] = img_hash
+            if IMAGE_HASH_MEMO_SIZE > 0 and not isinstance(img_hash, Exception):
+                _image_hash_memo[digests[i]] = img_hash
+                if len(_image_hash_memo) > IMAGE_HASH_MEMO_SIZE:
+                    _image_hash_memo.popitem(last=False)
+    return results
+
+def hash_image_bytes(image_bytes):
+    """
+    Hash perceptual de una sola imagen
+    """
+    img_hash = hash_images_bytes([image_bytes])[0]
+    if isinstance(img_hash, Exception):
+        raise img_hash
+    return img_hash
+
+def hash_pdf_images(pdf_document, xrefs):
+    """
+    Extrae y hashea por lotes las imágenes (xref) indicadas de un PDF.
+    Devuelve {xref: hash o excepción}.
+    """
+    hashes = {}
+    for start in range(0, len(xrefs), HASH_BATCH_SIZE):
+        batch = []
+        with metrics.stage('extract_image'):
+            for xref in xrefs[start:start + HASH_BATCH_SIZE]:
+                try:
+                    batch.append((xref, pdf_document.extract_image(xref)["image"]))
+                except Exception as e:
+                    hashes[xref] = e
+        results = hash_images_bytes([image_bytes for _xref, image_bytes in batch])
+        for (xref, _image_bytes), img_hash in zip(batch, results):
+            hashes[xref] = img_hash
+        del batch
+    return hashes
+
+def build_row_index(blocks, rules):
+    """
+    Índice de los bloques de texto de una página ordenado por centro vertical.
+    El filtro de cabeceras y la búsqueda de precios se hacen una vez por bloque.
+    """
+    entries = []
+    for order, block in enumerate(blocks):
+        if len(block) < 5:
+            continue
+        
+        block_y = (block[1] + block[3]) / 2
+        text_clean = block[4].strip()
+        
+        # Ignorar cabeceras
+        if rules.is_header(text_clean.upper()):
+            continue
+        
+        numbers = [int(n) for n in PRICE_PATTERN.findall(text_clean)]
+        numbers = [n for n in numbers if 10 <= n <= 5000]
+        entries.append((block_y, order, text_clean, numbers))
+    
+    entries.sort(key=lambda e: (e[0], e[1]))
+    return [e[0] for e in entries], entries
+
+def find_row_blocks(row_index, img_y, tolerance=ROW_TOLERANCE):
+    """
+    Bloques en la misma fila que la imagen, en el orden original de la página
+    """
+    ys, entries = row_index
+    lo = bisect_left(ys, img_y - tolerance)
+    hi = bisect_right(ys, img_y + tolerance)
+    row = [e for e in entries[lo:hi] if abs(e[0] - img_y) < tolerance]
+    row.sort(key=lambda e: e[1])
+    return row
+
+def triage_page(page, image_list, row_index, mode=PAGE_TRIAGE):
+    """
+    Clasifica una página antes de la parte cara (decodificar y hashear).
+    Devuelve None si parece una página de productos o el motivo para saltarla.
+    """
+    _ys, entries = row_index
+    price_blocks = sum(1 for entry in entries if entry[3])
+    
+    # Sin números tipo precio ninguna imagen puede formar un producto
+    if price_blocks == 0:
+        return 'no_prices'
+    if mode == 'safe':
+        return None
+    
+    # Portada o banner: pocas imágenes, una que ocupa buena parte de la página
+    # y sin precio en su fila (si lo tiene es un catálogo de un producto por página)
+    if len(image_list) <= 2 and price_blocks <= 1:
+        page_area = abs(page.rect) or 1
+        largest = max((fitz.Rect(info['bbox']) for info in page.get_image_info()), key=abs, default=None)
+        if largest is not None and abs(largest) / page_area >= TRIAGE_BANNER_AREA:
+            img_y = (largest.y0 + largest.y1) / 2
+            if not any(entry[3] for entry in find_row_blocks(row_index, img_y)):
+                return 'banner'
+    
+    # Términos y condiciones: mucho texto y muy pocos valores tipo precio distintos
+    text_chars = sum(len(entry[2]) for entry in entries)
+    if text_chars >= TRIAGE_TEXT_CHARS:
+        prices = len({number for entry in entries for number in entry[3]})
+        if text_chars / prices >= TRIAGE_CHARS_PER_PRICE:
+            return 'text_page'
+    return None
 
-def resize_image(image, max_size=MAX_IMAGE_SIZE):
+def find_decorative_xrefs(pdf_document, min_pages):
     """
-    Redimensiona imagen manteniendo aspect ratio
-    Reduce significativamente el uso de memoria
+    Imágenes (xref) que aparecen en al menos min_pages páginas del documento
     """
-    image.thumbnail(max_size, Image.Resampling.LANCZOS)
-    return image
+    pages_per_xref = defaultdict(int)
+    for page in pdf_document:
+        for xref in {img[0] for img in page.get_images(full=True)}:
+            pages_per_xref[xref] += 1
+    return {xref for xref, count in pages_per_xref.items() if count >= min_pages}
 
-def extract_from_pdf(pdf_file):
+def track_pages(pages, on_page=None):
+    """
+    Itera las páginas avisando a on_page(procesadas, total) al terminar cada una
+    """
+    total = len(pages)
+    for done, page_num in enumerate(pages, 1):
+        yield page_num
+        if on_page is not None:
+            on_page(done, total)
+
+def extract_from_pdf(pdf_file, pages=None, on_page=None, provider=None):
     """
     Extrae productos de un catálogo PDF asociando imágenes con texto cercano
+
+    pdf_file puede ser un archivo abierto o una ruta en disco.
+    pages limita la extracción a un rango de páginas (procesamiento por partes).
+    on_page(procesadas, total) se llama al terminar cada página.
+    provider selecciona las reglas propias del proveedor (rules.json).
     """
     products = []
     pdf_document = None
     
-    # Palabras clave que indican que NO es un producto
-    HEADER_KEYWORDS = [
-        'PRODUCTO', 'FOTO', 'MODELO', 'MAYOREO', 'MITAD', 'CAJA', 'CANTIDAD',
-        'DESCRIPCION', 'DESCRIPCIÓN', 'PRECIO', 'MOQ', 'SKU', 'CODIGO',
-        'CATEGORIA', 'DISPONIBILIDAD', 'PZAS', 'MENUDEO', 'LISTA', 'CODIGO DE PRODUCTO'
-    ]
+    # Cabeceras, categorías y MOQ compilados desde rules.json
+    rules = rule_engine.for_provider(provider)
     
     try:
-        # Leer el PDF en memoria
-        pdf_bytes = pdf_file.read()
-        pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
+        if isinstance(pdf_file, str):
+            pdf_document = fitz.open(pdf_file)
+        else:
+            # Leer el PDF en memoria
+            pdf_bytes = pdf_file.read()
+            pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
         
         total_pages = len(pdf_document)
-        print(f"📄 PDF con {total_pages} páginas")
+        if pages is None:
+            pages = range(total_pages)
+            logger.info(f"📄 PDF con {total_pages} páginas")
+        else:
+            logger.info(f"📄 PDF con {total_pages} páginas (procesando {pages.start + 1}-{pages.stop})")
+        
+        # Hash por xref: la misma imagen incrustada se procesa una sola vez por documento
+        xref_hashes = {}
+        
+        # Se cuenta sobre todo el documento aunque se procese solo un rango
+        decorative_xrefs = set()
+        if DECORATIVE_IMAGE_MIN_PAGES > 0:
+            decorative_xrefs = find_decorative_xrefs(pdf_document, DECORATIVE_IMAGE_MIN_PAGES)
+            if decorative_xrefs:
+                logger.info(f"🎨 {len(decorative_xrefs)} imágenes decorativas ignoradas")
         
-        for page_num in range(total_pages):
+        for page_num in track_pages(pages, on_page):
             page = pdf_document[page_num]
+            metrics.count('pages')
             
             # Extraer imágenes con sus posiciones
             image_list = page.get_images(full=True)
             
             if not image_list:
-                print(f"📄 Página {page_num + 1}: Sin imágenes, saltando...")
+                logger.debug("📄 Página %d: Sin imágenes, saltando...", page_num + 1)
                 continue
             
             # Extraer texto con posiciones (bloques)
-            blocks = page.get_text("blocks")
+            with metrics.stage('text'):
+                blocks = page.get_text("blocks")
+                row_index = build_row_index(blocks, rules)
+            del blocks
             
-            print(f"📄 Página {page_num + 1}/{total_pages}: {len(image_list)} imágenes")
+            logger.debug("📄 Página %d/%d: %d imágenes", page_num + 1, total_pages, len(image_list))
+            metrics.count('images', len(image_list))
+            
+            if PAGE_TRIAGE != 'off':
+                with metrics.stage('triage'):
+                    skip_reason = triage_page(page, image_list, row_index)
+                if skip_reason is not None:
+                    prefix = 'triage_would_skip' if PAGE_TRIAGE == 'dry-run' else 'triage_skipped'
+                    metrics.count(f"{prefix}_pages")
+                    metrics.count(f"{prefix}_images", len(image_list))
+                    metrics.count(f"{prefix}_{skip_reason}")
+                    logger.debug("⏭️ Página %d: %s", page_num + 1, skip_reason)
+                    if PAGE_TRIAGE != 'dry-run':
+                        continue
+            
+            # Calcular por lote los hashes de las imágenes nuevas de la página
+            new_xrefs = list(dict.fromkeys(
+                img[0] for img in image_list
+                if img[0] not in xref_hashes and img[0] not in decorative_xrefs
+            ))
+            if new_xrefs:
+                xref_hashes.update(hash_pdf_images(pdf_document, new_xrefs))
             
             # Para cada imagen, buscar texto cercano
+            row_match_start = time.perf_counter()
             for img_index, img in enumerate(image_list):
                 try:
-                    # Extraer la imagen
                     xref = img[0]
-                    base_image = pdf_document.extract_image(xref)
-                    image_bytes = base_image["image"]
-                    
-                    # Convertir a PIL Image
-                    image = Image.open(io.BytesIO(image_bytes))
-                    
-                    # Optimizar imagen
-                    image = resize_image(image)
-                    if image.mode not in ('RGB', 'L'):
-                        image = image.convert('RGB')
+                    if xref in decorative_xrefs:
+                        metrics.count('images_skipped')
+                        continue
                     
-                    # Calcular hash
-                    img_hash = str(imagehash.phash(image, hash_size=HASH_SIZE))
+                    img_hash = xref_hashes[xref]
+                    if isinstance(img_hash, Exception):
+                        raise img_hash
                     
                     # Obtener posición de la imagen en la página
                     img_rect = page.get_image_bbox(img)
@@ -88,31 +440,13 @@ def extract_from_pdf(pdf_file):
                     row_texts = []
                     row_numbers = []
                     
-                    for block in blocks:
-                        if len(block) < 5:
-                            continue
-                        
-                        x0, y0, x1, y1, text = block[0], block[1], block[2], block[3], block[4]
-                        block_y = (y0 + y1) / 2
+                    for _block_y, _order, text_clean, numbers in find_row_blocks(row_index, img_y):
+                        # Guardar texto
+                        if len(text_clean) > 2:
+                            row_texts.append(text_clean)
                         
-                        # Si está en la misma fila que la imagen
-                        if abs(block_y - img_y) < 50:
-                            text_clean = text.strip()
-                            
-                            # Ignorar cabeceras
-                            if any(keyword in text_clean.upper() for keyword in HEADER_KEYWORDS):
-                                continue
-                            
-                            # Guardar texto
-                            if len(text_clean) > 2:
-                                row_texts.append(text_clean)
-                            
-                            # Buscar números (precios)
-                            numbers = re.findall(r'\b(\d{2,4})\b', text_clean)
-                            for num_str in numbers:
-                                num = int(num_str)
-                                if 10 <= num <= 5000:
-                                    row_numbers.append(num)
+                        # Números (precios) ya filtrados al construir el índice
+                        row_numbers.extend(numbers)
                     
                     # Buscar descripción (texto más largo que no sea número)
                     description = None
@@ -159,29 +493,13 @@ def extract_from_pdf(pdf_file):
                         price_caja = row_numbers[0]
                     else:
                         # Si no hay precios, saltar este producto
-                        print(f"⚠️ Imagen {img_index+1}: Sin precios, saltando")
+                        logger.debug("⚠️ Imagen %d: Sin precios, saltando", img_index + 1)
+                        metrics.count('images_skipped')
                         continue
                     
-                    # Buscar MOQ
-                    moq = 100
-                    for text in row_texts:
-                        if 'PIEZA' in text.upper() or 'DOCENA' in text.upper():
-                            moq_match = re.search(r'(\d+)\s*(?:PIEZA|DOCENA|CAJITA)', text, re.IGNORECASE)
-                            if moq_match:
-                                moq = int(moq_match.group(1))
-                                break
-                    
-                    # Detectar categoría
-                    category = 'GENERAL'
-                    desc_lower = description.lower()
-                    if any(word in desc_lower for word in ['gorro', 'bufanda', 'caballero', 'dama', 'niño', 'niña', 'sombrero']):
-                        category = 'ROPA Y ACCESORIOS'
-                    elif any(word in desc_lower for word in ['navidad', 'luces', 'estrellitas', 'decoracion', 'regalo']):
-                        category = 'DECORACION'
-                    elif any(word in desc_lower for word in ['bolsa', 'empaque', 'papel']):
-                        category = 'EMPAQUES Y REGALOS'
-                    elif any(word in desc_lower for word in ['impermeable', 'tira', 'led', 'usb']):
-                        category = 'ELECTRONICA'
+                    # Buscar MOQ y detectar categoría
+                    moq = rules.moq(row_texts)
+                    category = rules.category(description)
                     
                     product = {
                         'sku': sku,
@@ -194,15 +512,16 @@ def extract_from_pdf(pdf_file):
                     }
                     
                     products.append(product)
-                    print(f"✅ {description[:40]} | SKU: {sku} | Precios: {price_mayoreo}/{price_mitad}/{price_caja} | MOQ: {moq}")
-                    
-                    # Limpiar memoria
-                    del image
-                    del image_bytes
+                    logger.debug(
+                        "✅ %s | SKU: %s | Precios: %s/%s/%s | MOQ: %s",
+                        description[:40], sku, price_mayoreo, price_mitad, price_caja, moq
+                    )
                     
                 except Exception as e:
-                    print(f"❌ Error en imagen {img_index+1}: {e}")
+                    logger.warning(f"❌ Error en imagen {img_index+1}: {e}")
+                    metrics.count('errors')
                     continue
+            metrics.add_stage('row_match', time.perf_counter() - row_match_start)
             
             # Limpiar memoria
             del page
@@ -210,117 +529,933 @@ def extract_from_pdf(pdf_file):
                 gc.collect()
         
     except Exception as e:
-        print(f"❌ Error leyendo PDF: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Error leyendo PDF: {e}")
+        metrics.count('errors')
     finally:
         if pdf_document:
             pdf_document.close()
         gc.collect()
     
-    print(f"📦 Total productos extraídos: {len(products)}")
+    metrics.count('products', len(products))
+    logger.info(f"📦 Total productos extraídos: {len(products)}")
     return products
 
-def extract_from_excel(excel_file):
+def detect_excel_columns(headers):
     """
-    Procesar Excel de forma optimizada
+    Mapea cada campo del producto a su columna (1-based) según los encabezados
+    """
+    col_mapping = {}
+    for idx, header in enumerate(headers, 1):
+        if header:
+            h = str(header).lower()
+            if 'sku' in h or 'codigo' in h or 'clave' in h:
+                col_mapping['sku'] = idx
+            elif 'descripcion' in h or 'producto' in h or 'nombre' in h or 'description' in h:
+                col_mapping['description'] = idx
+            elif 'menudeo' in h or 'retail' in h:
+                col_mapping['price'] = idx
+            elif 'precio' in h and 'price' not in col_mapping:
+                col_mapping['price'] = idx
+            elif 'caja' in h or 'mayoreo' in h or 'wholesale' in h:
+                col_mapping['priceCaja'] = idx
+            elif 'moq' in h or 'minimo' in h or 'minimum' in h:
+                col_mapping['moq'] = idx
+            elif 'categoria' in h or 'category' in h:
+                col_mapping['category'] = idx
+    return col_mapping
+
+def build_excel_product(cell_value, row, col_mapping, img_hash):
     """
-    from openpyxl import load_workbook
+    Producto de una fila con imagen. cell_value(columna) devuelve el valor
+    de esa columna en la fila.
+    """
+    # Leer datos de la fila
+    sku = cell_value(col_mapping.get('sku', 1)) or f"XLS-{row}"
+    description = cell_value(col_mapping.get('description', 2)) or "Producto sin descripción"
+    price = cell_value(col_mapping.get('price', 3)) or 50.00
+    price_caja = cell_value(col_mapping.get('priceCaja', 4))
+    
+    if not price_caja:
+        price_caja = float(price) * 0.85
+    
+    moq = cell_value(col_mapping.get('moq', 5)) or 100
+    category = cell_value(col_mapping.get('category', 6)) or "GENERAL"
     
+    return {
+        'sku': str(sku),
+        'description': str(description),
+        'priceMenudeo': float(price),
+        'priceCaja': float(price_caja),
+        'moq': int(moq),
+        'category': str(category),
+        'image_hash': img_hash,
+    }
+
+def extract_from_excel_full(excel_file):
+    """
+    Motor openpyxl completo: carga el libro entero con sus imágenes
+    """
     products = []
     wb = None
     
     try:
-        wb = load_workbook(excel_file, data_only=True)
+        with metrics.stage('excel_read'):
+            wb = load_workbook(excel_file, data_only=True)
         sheet = wb.active
         
         # Detectar columnas
         headers = [cell.value for cell in sheet[1]]
+        col_mapping = detect_excel_columns(headers)
         
-        col_mapping = {}
-        for idx, header in enumerate(headers, 1):
-            if header:
-                h = str(header).lower()
-                if 'sku' in h or 'codigo' in h or 'clave' in h:
-                    col_mapping['sku'] = idx
-                elif 'descripcion' in h or 'producto' in h or 'nombre' in h or 'description' in h:
-                    col_mapping['description'] = idx
-                elif 'menudeo' in h or 'retail' in h:
-                    col_mapping['price'] = idx
-                elif 'precio' in h and 'price' not in col_mapping:
-                    col_mapping['price'] = idx
-                elif 'caja' in h or 'mayoreo' in h or 'wholesale' in h:
-                    col_mapping['priceCaja'] = idx
-                elif 'moq' in h or 'minimo' in h or 'minimum' in h:
-                    col_mapping['moq'] = idx
-                elif 'categoria' in h or 'category' in h:
-                    col_mapping['category'] = idx
-        
-        print(f"📊 Columnas detectadas: {col_mapping}")
+        logger.info(f"📊 Columnas detectadas: {col_mapping}")
         
         # Extraer imágenes
+        metrics.count('images', len(sheet._images))
         for image in sheet._images:
             try:
                 row = image.anchor._from.row + 1
                 
-                # Leer datos de la fila
-                sku = sheet.cell(row, col_mapping.get('sku', 1)).value or f"XLS-{row}"
-                description = sheet.cell(row, col_mapping.get('description', 2)).value or "Producto sin descripción"
-                price = sheet.cell(row, col_mapping.get('price', 3)).value or 50.00
-                price_caja = sheet.cell(row, col_mapping.get('priceCaja', 4)).value
-                
-                if not price_caja:
-                    price_caja = float(price) * 0.85
-                
-                moq = sheet.cell(row, col_mapping.get('moq', 5)).value or 100
-                category = sheet.cell(row, col_mapping.get('category', 6)).value or "GENERAL"
-                
-                # Convertir imagen
+                # Convertir imagen y calcular hash
                 img_bytes = image._data()
-                img = Image.open(io.BytesIO(img_bytes))
-                
-                # **OPTIMIZACIÓN: Reducir tamaño**
-                img = resize_image(img)
-                
-                if img.mode not in ('RGB', 'L'):
-                    img = img.convert('RGB')
-                
-                img_hash = str(imagehash.phash(img, hash_size=HASH_SIZE))
-                
-                product = {
-                    'sku': str(sku),
-                    'description': str(description),
-                    'priceMenudeo': float(price),
-                    'priceCaja': float(price_caja),
-                    'moq': int(moq),
-                    'category': str(category),
-                    'image_hash': img_hash,
-                }
+                img_hash = hash_image_bytes(img_bytes)
                 
+                product = build_excel_product(
+                    lambda col: sheet.cell(row, col).value, row, col_mapping, img_hash
+                )
                 products.append(product)
                 
                 # Limpiar
-                del img
                 del img_bytes
                 
             except Exception as e:
-                print(f"❌ Error en fila {row}: {e}")
+                logger.warning(f"❌ Error en fila {row}: {e}")
+                metrics.count('errors')
                 continue
         
     except Exception as e:
-        print(f"❌ Error leyendo Excel: {e}")
+        logger.error(f"❌ Error leyendo Excel: {e}")
+        metrics.count('errors')
     finally:
         if wb:
             wb.close()
         gc.collect()
     
-    print(f"📦 Total productos del Excel: {len(products)}")
     return products
 
+def extract_from_excel_fast(excel_file):
+    """
+    Motor rápido: índice fila -> imagen desde el dibujo de la hoja y lectura
+    read-only de solo las filas ancladas. Mismos productos que el motor completo.
+    Los errores al leer la estructura del libro se propagan (para usar el motor completo).
+    """
+    products = []
+    
+    with metrics.stage('excel_read'):
+        anchors = read_image_anchors(excel_file)
+        rows_needed = {1} | {anchor.row for anchor in anchors}
+        
+        # Leer en streaming solo hasta la última fila con imagen
+        row_values = {}
+        wb = load_workbook(excel_file, read_only=True, data_only=True)
+        try:
+            sheet = wb.active
+            rows = sheet.iter_rows(min_row=1, max_row=max(rows_needed), values_only=True)
+            for row_idx, values in enumerate(rows, 1):
+                if row_idx in rows_needed:
+                    row_values[row_idx] = values
+        finally:
+            wb.close()
+    metrics.count('images', len(anchors))
+    
+    col_mapping = detect_excel_columns(row_values.get(1, ()))
+    logger.info(f"📊 Columnas detectadas: {col_mapping}")
+    
+    # Hashear las imágenes por lotes
+    images = read_anchor_images(excel_file, anchors)
+    while True:
+        batch = list(itertools.islice(images, HASH_BATCH_SIZE))
+        if not batch:
+            break
+        hashes = hash_images_bytes([img_bytes for _anchor, img_bytes in batch])
+        
+        for (anchor, _img_bytes), img_hash in zip(batch, hashes):
+            row = anchor.row
+            values = row_values.get(row, ())
+            try:
+                if isinstance(img_hash, Exception):
+                    raise img_hash
+                product = build_excel_product(
+                    lambda col: values[col - 1] if col <= len(values) else None,
+                    row, col_mapping, img_hash
+                )
+                products.append(product)
+            except Exception as e:
+                logger.warning(f"❌ Error en fila {row}: {e}")
+                metrics.count('errors')
+                continue
+        del batch
+    
+    return products
+
+def extract_from_excel(excel_file):
+    """
+    Procesar Excel de forma optimizada
+
+    Los .xls se convierten a .xlsx con LibreOffice si está instalado.
+    """
+    converted_dir = None
+    if isinstance(excel_file, str) and excel_file.lower().endswith('.xls'):
+        converted = convert_xls_to_xlsx(excel_file)
+        if converted is None:
+            logger.error("❌ Error leyendo Excel: formato .xls requiere LibreOffice (soffice) para convertirlo")
+            metrics.count('errors')
+            return []
+        excel_file = converted
+        converted_dir = os.path.dirname(converted)
+    
+    try:
+        products = None
+        if EXCEL_ENGINE == 'fast':
+            try:
+                products = extract_from_excel_fast(excel_file)
+            except Exception as e:
+                logger.warning(f"⚠️ Motor Excel rápido falló ({e}), usando openpyxl completo")
+                if not isinstance(excel_file, str):
+                    excel_file.seek(0)
+        if products is None:
+            products = extract_from_excel_full(excel_file)
+    finally:
+        if converted_dir:
+            shutil.rmtree(converted_dir, ignore_errors=True)
+        gc.collect()
+    
+    metrics.count('products', len(products))
+    logger.info(f"📦 Total productos del Excel: {len(products)}")
+    return products
+
+def extractor_settings(kind, provider=None):
+    """
+    Configuración que afecta el resultado de la extracción (parte de la llave de caché)
+    """
+    settings = {
+        'kind': kind,
+        'version': EXTRACTOR_VERSION,
+        'max_image_size': list(MAX_IMAGE_SIZE),
+        'hash_size': HASH_SIZE,
+        'hash_version': hash_engine.version,
+        'decorative_min_pages': DECORATIVE_IMAGE_MIN_PAGES,
+    }
+    if kind == 'pdf':
+        settings['rules'] = rule_engine.for_provider(provider).digest
+        if PAGE_TRIAGE == 'on':
+            # Las heurísticas pueden cambiar el resultado ('safe' no)
+            settings['page_triage'] = [PAGE_TRIAGE, TRIAGE_BANNER_AREA, TRIAGE_TEXT_CHARS]
+    return settings
+
+def file_kind(filename):
+    """
+    Tipo de extractor según la extensión ('pdf', 'excel' o None)
+    """
+    if filename.endswith('.pdf'):
+        return 'pdf'
+    if filename.endswith(('.xlsx', '.xls')):
+        return 'excel'
+    return None
+
+def extraction_cache_key(content_digest, kind, provider=None):
+    return ExtractionCache.make_key(content_digest, extractor_settings(kind, provider))
+
+def spool_upload(file, filename):
+    """
+    Copia la subida a un archivo temporal por bloques, calculando el SHA-256
+    al mismo tiempo. Si la subida ya es un archivo en disco (trabajos
+    asíncronos) se usa directamente sin copiarla.
+    Devuelve (ruta, digest, tamaño, es_temporal).
+    """
+    digest = hashlib.sha256()
+    stream = getattr(file, 'stream', file)
+    existing_path = getattr(stream, 'name', None)
+    
+    if isinstance(existing_path, str) and os.path.isfile(existing_path):
+        with open(existing_path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(SPOOL_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return existing_path, digest.hexdigest(), os.path.getsize(existing_path), False
+    
+    size = 0
+    suffix = os.path.splitext(filename)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix, dir=SPOOL_DIR, delete=False) as tmp:
+        for chunk in iter(lambda: stream.read(SPOOL_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            tmp.write(chunk)
+            size += len(chunk)
+    return tmp.name, digest.hexdigest(), size, True
+
+def release_upload(path, is_temporary):
+    if not is_temporary:
+        return
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+def provider_from_filename(filename):
+    """
+    Nombre del proveedor a partir del archivo (elimina _parte1, _parte2, etc)
+    """
+    base_name = filename.split('.')[0]
+    # Remover _parte, _part, -parte, -part seguido de números
+    return re.sub(r'[_-]?(parte?|part)[_-]?\d+$', '', base_name, flags=re.IGNORECASE)
+
+def extract_products(file, filename, on_page=None, provider=None):
+    """
+    Extrae productos de un archivo subido usando la caché por contenido.
+    provider elige las reglas del proveedor (por default, el del nombre del
+    archivo). Devuelve None si el formato no está soportado.
+    """
+    kind = file_kind(filename)
+    if kind is None:
+        return None
+
+    provider = provider or provider_from_filename(filename)
+    path, content_digest, _size, is_temporary = spool_upload(file, filename)
+    errors_before = metrics.current_count('errors')
+    try:
+        cache_key = None
+        if extraction_cache is not None:
+            cache_key = extraction_cache_key(content_digest, kind, provider)
+            products = extraction_cache.get(cache_key)
+            if products is not None:
+                logger.info(f"⚡ Caché: {len(products)} productos reutilizados")
+                return products
+
+        if kind == 'pdf':
+            products = extract_from_pdf(path, on_page=on_page, provider=provider)
+        else:
+            products = extract_from_excel(path)
+    finally:
+        release_upload(path, is_temporary)
+
+    # No guardar resultados vacíos ni parciales (alguna imagen o fila falló):
+    # pueden venir de un error transitorio
+    complete = metrics.current_count('errors') == errors_before
+    if products and complete and cache_key is not None:
+        extraction_cache.put(cache_key, products)
+    return products
+
+def get_process_pool():
+    """
+    Pool de procesos compartido, creado al primer uso (después del fork de gunicorn)
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_pool_worker,
+            )
+        return _process_pool
+
+def _init_pool_worker():
+    # El desglose de cada tarea ya lo suma el proceso web (metrics.merge)
+    metrics.disable_sharing()
+
+def pool_worker_pids():
+    """
+    PIDs de los workers del pool (para medir su memoria junto con la del proceso web)
+    """
+    pool = _process_pool
+    if pool is None:
+        return []
+    return list(getattr(pool, '_processes', None) or {})
+
+def plan_pdf_chunks(total_pages, file_size, workers=MAX_WORKERS):
+    """
+    Divide las páginas de un PDF en rangos contiguos para el pool.
+    Cada rango se limita para que su parte estimada del archivo no pase
+    de POOL_CHUNK_MAX_MB, así un catálogo enorme no satura a un worker.
+    """
+    if total_pages <= 0:
+        return []
+    pages_per_chunk = math.ceil(total_pages / (workers * POOL_CHUNKS_PER_WORKER))
+    avg_page_bytes = max(1, file_size // total_pages)
+    max_pages_by_memory = max(1, (POOL_CHUNK_MAX_MB * 1024 * 1024) // avg_page_bytes)
+    pages_per_chunk = max(1, min(pages_per_chunk, max_pages_by_memory))
+    return [
+        range(start, min(start + pages_per_chunk, total_pages))
+        for start in range(0, total_pages, pages_per_chunk)
+    ]
+
+def _extract_files_sequential(files, progress, provider=None):
+    # **OPTIMIZACIÓN 6: Procesar archivo por archivo y limpiar memoria**
+    for idx, file in enumerate(files):
+        logger.info(f"📄 Procesando archivo {idx+1}/{len(files)}: {file.filename}")
+        progress(idx, status='running')
+        on_page = lambda done, total, idx=idx: progress(idx, pagesDone=done, pagesTotal=total)
+        try:
+            yield idx, file, extract_products(file, file.filename.lower(), on_page=on_page, provider=provider)
+        except Exception as e:
+            logger.error(f"❌ Error procesando {file.filename}: {e}")
+            metrics.count('errors')
+            progress(idx, status='failed')
+            continue
+
+def _extract_files_parallel(files, progress, provider=None):
+    """
+    Reparte archivos y rangos de páginas en el pool de procesos.
+    Los resultados se unen en el orden de subida y de páginas, así que la
+    salida es idéntica a la del modo secuencial.
+    """
+    pool = get_process_pool()
+    results = [None] * len(files)
+    pending = []  # (índice, llave de caché, futures en orden de páginas)
+    spooled = []  # (ruta, es_temporal)
+    pages_done = [0] * len(files)
+    pages_lock = threading.Lock()
+
+    def on_chunk_done(idx, num_pages):
+        def callback(_future):
+            with pages_lock:
+                pages_done[idx] += num_pages
+                done = pages_done[idx]
+            progress(idx, pagesDone=done)
+        return callback
+
+    try:
+        for idx, file in enumerate(files):
+            filename = file.filename.lower()
+            kind = file_kind(filename)
+            if kind is None:
+                continue
+            file_provider = provider or provider_from_filename(filename)
+
+            # Los workers abren el archivo desde disco en lugar de recibir los bytes
+            path, content_digest, size, is_temporary = spool_upload(file, filename)
+            spooled.append((path, is_temporary))
+
+            cache_key = None
+            if extraction_cache is not None:
+                cache_key = extraction_cache_key(content_digest, kind, file_provider)
+                cached = extraction_cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"⚡ Caché: {len(cached)} productos reutilizados ({file.filename})")
+                    results[idx] = cached
+                    continue
+
+            progress(idx, status='running')
+            if kind == 'pdf':
+                try:
+                    with fitz.open(path) as doc:
+                        total_pages = len(doc)
+                    chunks = plan_pdf_chunks(total_pages, size)
+                    progress(idx, pagesTotal=total_pages)
+                except Exception as e:
+                    logger.error(f"❌ Error leyendo PDF {file.filename}: {e}")
+                    chunks = [None]
+                futures = []
+                for chunk in chunks:
+                    future = pool.submit(_pool_task, extract_from_pdf, path, chunk, None, file_provider)
+                    if chunk is not None:
+                        future.add_done_callback(on_chunk_done(idx, len(chunk)))
+                    futures.append(future)
+            else:
+                futures = [pool.submit(_pool_task, extract_from_excel, path)]
+
+            logger.info(f"📄 Archivo {idx+1}/{len(files)}: {file.filename} ({len(futures)} tareas)")
+            pending.append((idx, cache_key, futures))
+
+        for idx, cache_key, futures in pending:
+            products = []
+            complete = True
+            for future in futures:
+                try:
+                    chunk_products, breakdown = future.result()
+                    products.extend(chunk_products)
+                    metrics.merge(breakdown)
+                    # Los extractores atrapan los errores por imagen/fila: resultado parcial
+                    if breakdown['counters'].get('errors'):
+                        complete = False
+                except Exception as e:
+                    logger.error(f"❌ Error en worker ({files[idx].filename}): {e}")
+                    metrics.count('errors')
+                    complete = False
+            # Igual que en extract_products: ni vacíos ni parciales
+            if complete and products and cache_key is not None:
+                extraction_cache.put(cache_key, products)
+            results[idx] = products
+    finally:
+        for path, is_temporary in spooled:
+            release_upload(path, is_temporary)
+
+    for idx, (file, products) in enumerate(zip(files, results)):
+        yield idx, file, products
+
+def _pool_task(func, *args):
+    """
+    Ejecuta un extractor en un worker del pool y devuelve también su
+    desglose de tiempos, que el proceso web suma a sus métricas
+    """
+    with metrics.request('pool') as timings:
+        result = func(*args)
+    return result, timings.as_dict()
+
+def _ignore_progress(file_index, **fields):
+    pass
+
+def extract_uploads(files, progress=None, provider=None):
+    """
+    Extrae los productos de todos los archivos subidos, en orden de subida.
+    progress(índice_archivo, **campos) recibe el avance por archivo y página.
+    provider (p. ej. el de /api/catalogs/<provider>) sustituye al proveedor
+    que se deduce del nombre de cada archivo, para reglas, caché y productos.
+    """
+    progress = progress or _ignore_progress
+    if EXECUTION_MODE == 'process' and MAX_WORKERS > 1:
+        extracted = _extract_files_parallel(files, progress, provider)
+    else:
+        extracted = _extract_files_sequential(files, progress, provider)
+
+    all_products = []
+    for idx, file, products in extracted:
+        if products is None:
+            logger.warning(f"⚠️ Formato no soportado: {file.filename.lower()}")
+            progress(idx, status='skipped')
+            continue
+
+        # Añadir nombre de proveedor
+        provider_name = provider or provider_from_filename(file.filename)
+        for product in products:
+            product['provider'] = provider_name
+
+        all_products.extend(products)
+        logger.info(f"✓ {len(products)} productos de {provider_name}")
+        progress(idx, status='done', products=len(products))
+
+        # **OPTIMIZACIÓN 7: Limpiar después de cada archivo**
+        del products
+        gc.collect()
+
+    return all_products
+
+def run_consolidation_job(job_id, payload):
+    """
+    Procesa un trabajo encolado a partir de los archivos guardados en disco
+    """
+    files = [
+        FileStorage(stream=open(path, 'rb'), filename=name)
+        for name, path in payload['files']
+    ]
+    
+    def progress(file_index, **fields):
+        job_store.update_file(job_id, file_index, **fields)
+    
+    try:
+        with metrics.request('job') as timings:
+            with PeakMemoryMonitor(extra_pids=pool_worker_pids) as memory_monitor:
+                all_products = extract_uploads(files, progress=progress)
+                if not all_products:
+                    raise ValueError('No se pudieron extraer productos de los archivos')
+                
+                consolidated, stats = consolidate_products(all_products, **payload['options'])
+                del all_products
+            timings.memory = memory_monitor.report()
+        
+        result = {
+            'success': True,
+            'resultId': result_cache.add(consolidated, stats, result_id=job_id),
+            'consolidated': consolidated,
+            'stats': stats,
+            'memory': timings.memory
+        }
+        if PAGE_TRIAGE != 'off':
+            result['triage'] = triage_report(timings)
+        if payload.get('timings'):
+            result['timings'] = timings.as_dict()
+        return result
+    finally:
+        for file in files:
+            file.close()
+        shutil.rmtree(payload['dir'], ignore_errors=True)
+        gc.collect()
+
+if RESULT_STORE == 'sqlite':
+    result_cache = SQLiteResultCache(RESULT_DB_PATH, RESULT_CACHE_SIZE)
+else:
+    result_cache = ResultCache(RESULT_CACHE_SIZE)
+
+job_store = SQLiteJobStore(JOB_DB_PATH) if JOB_STORE == 'sqlite' else MemoryJobStore()
+job_queue = JobQueue(job_store, run_consolidation_job, workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE)
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({'status': 'healthy', 'message': 'API optimizada - PDF y Excel'}), 200
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Métricas en formato de texto de Prometheus
+    """
+    gauges = {
+        'process_rss_bytes': rss_bytes(),
+        'jobs_pending': job_queue.pending(),
+        'image_hash_memo_entries': len(_image_hash_memo),
+    }
+    if extraction_cache is not None:
+        cache = extraction_cache.stats()
+        gauges['extraction_cache_hits'] = cache['hits']
+        gauges['extraction_cache_misses'] = cache['misses']
+        gauges['extraction_cache_size_bytes'] = cache['sizeBytes']
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    if extraction_cache is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **extraction_cache.stats()}), 200
+
+def stream_consolidation_ndjson(files, options, output, include_timings=False):
+    """
+    Respuesta NDJSON: un producto consolidado por línea en cuanto se termina
+    su grupo, y al final una línea con success, stats y memory (y timings
+    si se pidió el desglose). El 200 ya se envió al fallar, así que un error
+    llega como última línea con success: false.
+    """
+    try:
+        yield from _ndjson_lines(files, options, output, include_timings)
+    except Exception as e:
+        logger.exception(f"❌ Error (streaming): {str(e)}")
+        metrics.count('errors')
+        yield json.dumps({
+            'success': False,
+            'error': str(e)
+        }, ensure_ascii=False) + '\n'
+    finally:
+        gc.collect()
+
+def _ndjson_lines(files, options, output, include_timings):
+    stats = ConsolidationStats()
+    with metrics.request('consolidate_ndjson') as timings:
+        with PeakMemoryMonitor(extra_pids=pool_worker_pids) as memory_monitor:
+            all_products = extract_uploads(files)
+            
+            if not all_products:
+                yield json.dumps({
+                    'success': False,
+                    'error': 'No se pudieron extraer productos de los archivos'
+                }, ensure_ascii=False) + '\n'
+                return
+            
+            marketing_seconds = 0.0
+            serialize_seconds = 0.0
+            for product in iter_consolidated(all_products, stats=stats, **options):
+                start = time.perf_counter()
+                product = present_product(product, output)
+                rendered = time.perf_counter()
+                line = json.dumps(product, ensure_ascii=False) + '\n'
+                marketing_seconds += rendered - start
+                serialize_seconds += time.perf_counter() - rendered
+                yield line
+            metrics.add_stage('marketing', marketing_seconds)
+            metrics.add_stage('serialize', serialize_seconds)
+            del all_products
+            gc.collect()
+        
+        timings.memory = memory_monitor.report()
+        summary = {
+            'success': True,
+            'stats': stats.as_dict(),
+            'memory': timings.memory
+        }
+        if PAGE_TRIAGE != 'off':
+            summary['triage'] = triage_report(timings)
+        if include_timings:
+            summary['timings'] = timings.as_dict()
+    
+    yield json.dumps(summary) + '\n'
+    logger.info(f"✅ Consolidación (streaming) completa: {stats.total_products} productos únicos")
+
+def triage_report(timings):
+    """
+    Páginas e imágenes saltadas por el triage en la petición (o que se
+    saltarían, en modo dry-run), con el conteo por motivo
+    """
+    prefix = 'triage_would_skip_' if PAGE_TRIAGE == 'dry-run' else 'triage_skipped_'
+    counters = {
+        name[len(prefix):]: value for name, value in timings.counters.items()
+        if name.startswith(prefix)
+    }
+    return {
+        'mode': PAGE_TRIAGE,
+        'applied': PAGE_TRIAGE != 'dry-run',
+        'pagesSkipped': counters.pop('pages', 0),
+        'imagesSkipped': counters.pop('images', 0),
+        'reasons': counters,
+    }
+
+def wants_timings(values):
+    return values.get('timings', '').lower() in ('1', 'true', 'yes')
+
+def parse_consolidation_options(form):
+    """
+    Opciones de consolidación enviadas en el formulario.
+    Devuelve (opciones, mensaje de error).
+    """
+    # Modo de agrupación (se puede cambiar por petición)
+    grouping_mode = form.get('grouping', GROUPING_MODE).lower()
+    if grouping_mode not in GROUPING_MODES:
+        return None, f"Modo de agrupación inválido: {grouping_mode}"
+    try:
+        threshold = int(form.get('threshold', HAMMING_THRESHOLD))
+    except ValueError:
+        return None, 'El umbral debe ser un número entero'
+    if not 0 <= threshold <= MAX_THRESHOLD:
+        return None, f"El umbral debe estar entre 0 y {MAX_THRESHOLD}"
+    return {'grouping_mode': grouping_mode, 'threshold': threshold}, None
+
+def parse_marketing_request(values):
+    """
+    Campos de TikTok Shop pedidos con marketing=all|none|campo1,campo2.
+    Devuelve (campos, mensaje de error).
+    """
+    try:
+        return parse_marketing_fields(values.get('marketing')), None
+    except ValueError as e:
+        return None, str(e)
+
+def parse_output_request(values):
+    """
+    Cómo armar la lista de productos de la respuesta: página y filtros
+    (ResultQuery), proyección (fields=campo1,campo2) y campos de marketing.
+    Devuelve (opciones, mensaje de error).
+    """
+    marketing_fields, error = parse_marketing_request(values)
+    if error:
+        return None, error
+    try:
+        query = ResultQuery.from_values(values, RESULT_PAGE_LIMIT, RESULT_PAGE_MAX)
+    except ValueError as e:
+        return None, str(e)
+    
+    projection = None
+    if values.get('fields'):
+        projection = tuple(name.strip() for name in values['fields'].split(',') if name.strip())
+        unknown = sorted(set(projection) - set(CONSOLIDATED_FIELDS) - set(MARKETING_FIELDS))
+        if unknown:
+            return None, f"Campos inválidos: {', '.join(unknown)}"
+        # Con proyección solo se genera el marketing que se va a devolver
+        marketing_fields = tuple(name for name in MARKETING_FIELDS if name in projection)
+    return {'query': query, 'fields': projection, 'marketing': marketing_fields}, None
+
+def present_product(product, output):
+    """
+    Copia del producto con el marketing pedido y, si hay proyección, solo esos campos
+    """
+    product = render_marketing(dict(product), output['marketing'])
+    if output['fields'] is not None:
+        return {name: product[name] for name in output['fields']}
+    return product
+
+def results_page(result_set, output):
+    """
+    Respuesta con una página (ya filtrada) de un resultado guardado
+    """
+    query = output['query']
+    products, total, next_cursor = result_set.page(query)
+    return {
+        'success': True,
+        'resultId': result_set.result_id,
+        'consolidated': [present_product(product, output) for product in products],
+        'stats': result_set.stats,
+        'pagination': {
+            'page': query.page if query.cursor is None else None,
+            'limit': query.limit,
+            'total': total,
+            'nextCursor': next_cursor,
+        },
+    }
+
+def build_consolidated_product(group, number):
+    """
+    Producto consolidado de un grupo: mejor precio, ahorro y alternativas
+    """
+    group_sorted = sorted(group, key=lambda x: x['priceCaja'])
+    best = group_sorted[0]
+    
+    prices = [p['priceCaja'] for p in group]
+    max_price = max(prices)
+    savings = round(max_price - best['priceCaja'], 2)
+    
+    alternatives = [
+        {
+            'provider': p['provider'],
+            'sku': p['sku'],
+            'priceCaja': p['priceCaja']
+        }
+        for p in group
+    ]
+    return make_consolidated_product(best, alternatives, savings, number)
+
+# Campos de un producto consolidado (sin el contenido de marketing)
+CONSOLIDATED_FIELDS = (
+    'consolidated_sku', 'description', 'priceMenudeo', 'priceCaja', 'moq', 'category',
+    'provider', 'num_providers', 'savings', 'alternatives',
+)
+
+def make_consolidated_product(best, alternatives, savings, number):
+    """
+    Producto consolidado a partir del mejor producto del grupo y sus alternativas.
+    El contenido para TikTok Shop se agrega al responder (render_marketing).
+    """
+    return {
+        'consolidated_sku': f"CONS-{str(number).zfill(4)}",
+        'description': best['description'],
+        'priceMenudeo': best['priceMenudeo'],
+        'priceCaja': best['priceCaja'],
+        'moq': best['moq'],
+        'category': best['category'],
+        'provider': best['provider'],
+        'num_providers': len(alternatives),
+        'savings': savings,
+        'alternatives': alternatives,
+    }
+
+class ConsolidationStats:
+    """
+    Estadísticas acumuladas producto por producto (sirve también en modo streaming)
+    """
+    
+    def __init__(self):
+        self.total_products = 0
+        self.total_savings = 0.0
+        self.duplicate_products = 0
+        self.total_providers = 0
+    
+    def add(self, product):
+        self.total_products += 1
+        self.total_savings += product['savings']
+        self.total_providers += product['num_providers']
+        if product['num_providers'] > 1:
+            self.duplicate_products += 1
+    
+    def as_dict(self):
+        return {
+            'totalProducts': self.total_products,
+            'totalSavings': round(self.total_savings, 2),
+            'duplicateProducts': self.duplicate_products,
+            'avgProviders': round(self.total_providers / self.total_products, 1) if self.total_products else 0
+        }
+
+def group_all_products(all_products, grouping_mode, threshold):
+    logger.info(f"📊 Total productos: {len(all_products)}")
+    
+    # Agrupar productos similares por hash de imagen
+    with metrics.stage('grouping'):
+        groups = group_products(
+            all_products, mode=grouping_mode, threshold=threshold,
+            bits=HASH_BITS, index=GROUPING_INDEX, prefilter_threshold=PREFILTER_THRESHOLD,
+        )
+    
+    logger.info(f"🔗 Grupos formados: {len(groups)}")
+    return groups
+
+def use_product_table():
+    return CONSOLIDATION_ENGINE == 'table' and HASH_BITS <= MAX_HASH_BITS
+
+def group_product_table(all_products, grouping_mode, threshold):
+    """
+    Pasa los productos a una ProductTable y la agrupa. Vacía all_products:
+    desde aquí los dicts de cada producto ya no se necesitan.
+    """
+    logger.info(f"📊 Total productos: {len(all_products)}")
+    
+    with metrics.stage('table'):
+        table = ProductTable(all_products)
+        all_products.clear()
+    with metrics.stage('grouping'):
+        groups = table.group(
+            grouping_mode, threshold, bits=HASH_BITS, index=GROUPING_INDEX,
+        )
+    
+    logger.info(f"🔗 Grupos formados: {len(groups)}")
+    return groups
+
+def consolidate_products(all_products, grouping_mode=GROUPING_MODE, threshold=HAMMING_THRESHOLD):
+    """
+    Agrupa los productos extraídos y elige el mejor precio de cada grupo.
+    Devuelve (consolidated, stats).
+    """
+    if use_product_table():
+        groups = group_product_table(all_products, grouping_mode, threshold)
+        
+        # Estadísticas sobre las columnas y consolidación directa en orden de categoría
+        order = groups.by_category()
+        stats = groups.stats(order)
+        with metrics.stage('consolidate'):
+            consolidated = [
+                make_consolidated_product(best, alternatives, savings, g + 1)
+                for g, best, alternatives, savings in groups.materialize(order)
+            ]
+        del groups, order
+        gc.collect()
+        
+        logger.info(f"✅ Consolidación completa: {stats['totalProducts']} productos únicos")
+        return consolidated, stats
+    
+    groups = group_all_products(all_products, grouping_mode, threshold)
+    
+    # Consolidar: elegir el mejor precio de cada grupo
+    with metrics.stage('consolidate'):
+        consolidated = [
+            build_consolidated_product(group, number)
+            for number, group in enumerate(groups, 1)
+        ]
+    
+    # Limpiar grupos de memoria
+    del groups
+    
+    # Ordenar por categoría
+    consolidated.sort(key=lambda x: x['category'])
+    gc.collect()
+    
+    # Calcular estadísticas
+    stats_accumulator = ConsolidationStats()
+    for product in consolidated:
+        stats_accumulator.add(product)
+    stats = stats_accumulator.as_dict()
+    
+    logger.info(f"✅ Consolidación completa: {stats['totalProducts']} productos únicos")
+    return consolidated, stats
+
+def iter_consolidated(all_products, grouping_mode=GROUPING_MODE, threshold=HAMMING_THRESHOLD, stats=None):
+    """
+    Versión streaming de consolidate_products: entrega cada producto en cuanto
+    se consolida su grupo (sin ordenar por categoría) y libera el grupo.
+    Si se pasa stats (ConsolidationStats) se va acumulando.
+    """
+    if use_product_table():
+        groups = group_product_table(all_products, grouping_mode, threshold)
+        for g, best, alternatives, savings in groups.materialize(range(len(groups))):
+            with metrics.stage('consolidate'):
+                product = make_consolidated_product(best, alternatives, savings, g + 1)
+            if stats is not None:
+                stats.add(product)
+            yield product
+        return
+    
+    groups = group_all_products(all_products, grouping_mode, threshold)
+    groups.reverse()  # pop() desde el final en orden original
+    
+    number = 0
+    while groups:
+        group = groups.pop()
+        number += 1
+        with metrics.stage('consolidate'):
+            product = build_consolidated_product(group, number)
+        if stats is not None:
+            stats.add(product)
+        yield product
+
 @app.route('/api/consolidate', methods=['POST'])
 def consolidate_catalogs():
     try:
@@ -338,174 +1473,367 @@ def consolidate_catalogs():
                 'error': 'Lista de archivos vacía'
             }), 400
         
-        print(f"📦 Recibidos {len(files)} archivos")
-        
-        all_products = []
-        
-        # **OPTIMIZACIÓN 6: Procesar archivo por archivo y limpiar memoria**
-        for idx, file in enumerate(files):
-            filename = file.filename.lower()
-            
-            # Extraer nombre del proveedor (eliminar _parte1, _parte2, etc)
-            base_name = file.filename.split('.')[0]
-            # Remover _parte, _part, -parte, -part seguido de números
-            import re
-            provider_name = re.sub(r'[_-]?(parte?|part)[_-]?\d+$', '', base_name, flags=re.IGNORECASE)
-            
-            print(f"📄 Procesando archivo {idx+1}/{len(files)}: {file.filename} (Proveedor: {provider_name})")
-            
-            try:
-                if filename.endswith('.pdf'):
-                    products = extract_from_pdf(file)
-                elif filename.endswith(('.xlsx', '.xls')):
-                    products = extract_from_excel(file)
-                else:
-                    print(f"⚠️ Formato no soportado: {filename}")
-                    continue
-                
-                # Añadir nombre de proveedor
-                for product in products:
-                    product['provider'] = provider_name
-                
-                all_products.extend(products)
-                print(f"✓ {len(products)} productos de {provider_name}")
-                
-                # **OPTIMIZACIÓN 7: Limpiar después de cada archivo**
-                del products
-                gc.collect()
-                
-            except Exception as e:
-                print(f"❌ Error procesando {file.filename}: {e}")
-                continue
+        logger.info(f"📦 Recibidos {len(files)} archivos")
         
-        if not all_products:
+        options, error = parse_consolidation_options(request.form)
+        if error:
             return jsonify({
                 'success': False,
-                'error': 'No se pudieron extraer productos de los archivos'
+                'error': error
             }), 400
         
-        print(f"📊 Total productos: {len(all_products)}")
+        # Página/filtros, proyección y campos de TikTok Shop a generar
+        output, error = parse_output_request(request.values)
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
         
-        # Agrupar productos similares por hash de imagen
-        groups = defaultdict(list)
-        for product in all_products:
-            groups[product['image_hash']].append(product)
+        # timings=1: incluir el desglose de tiempos por etapa en la respuesta
+        include_timings = wants_timings(request.values)
         
-        print(f"🔗 Grupos formados: {len(groups)}")
+        # format=ndjson: respuesta en streaming, un producto por línea
+        output_format = request.values.get('format', 'json').lower()
+        if output_format == 'ndjson':
+            if output['query'].paged:
+                return jsonify({
+                    'success': False,
+                    'error': 'La paginación y los filtros no aplican a format=ndjson'
+                }), 400
+            return Response(
+                stream_with_context(stream_consolidation_ndjson(files, options, output, include_timings)),
+                mimetype='application/x-ndjson'
+            )
+        if output_format != 'json':
+            return jsonify({
+                'success': False,
+                'error': f"Formato de salida inválido: {output_format}"
+            }), 400
         
-        # Consolidar: elegir el mejor precio de cada grupo
-        consolidated = []
-        for hash_key, group in groups.items():
-            group_sorted = sorted(group, key=lambda x: x['priceCaja'])
-            best = group_sorted[0]
-            
-            prices = [p['priceCaja'] for p in group]
-            max_price = max(prices)
-            savings = round(max_price - best['priceCaja'], 2)
-            
-            # Generar contenido optimizado para TikTok Shop
-            description_clean = best['description'][:60].strip()
-            
-            # Título optimizado (máx 60 caracteres)
-            optimized_title = f"{description_clean} | {best['category']}"[:60]
-            
-            # Descripción optimizada con emojis y formato TikTok
-            optimized_description = f"""✨ {description_clean}
-
-🎯 CARACTERÍSTICAS:
-• Categoría: {best['category']}
-• MOQ: {best['moq']} piezas
-• Disponible con múltiples proveedores
-
-💰 PRECIO:
-• Menudeo: ${best['priceMenudeo']:.2f}
-• Por Caja: ${best['priceCaja']:.2f}
-
-📦 Envíos disponibles
-✅ Calidad garantizada
-🚀 Entrega rápida"""
-
-            # Hashtags relevantes
-            category_hashtags = {
-                'ROPA Y ACCESORIOS': '#fashion #accesorios #moda #estilo',
-                'DECORACION': '#decoracion #hogar #navidad #luces',
-                'EMPAQUES Y REGALOS': '#regalo #empaque #bolsas #packaging',
-                'ELECTRONICA': '#tech #electronica #gadgets #led',
-                'GENERAL': '#productos #mayoreo #ventas'
-            }
-            
-            base_hashtags = '#tiktokshop #mayoreo #preciosmayoreo #ventasonline'
-            category_specific = category_hashtags.get(best['category'], '#productos')
-            hashtags = f"{base_hashtags} {category_specific}"
-            
-            # Calcular margen sugerido (30-50%)
-            suggested_retail_low = round(best['priceCaja'] * 1.3, 2)
-            suggested_retail_high = round(best['priceCaja'] * 1.5, 2)
+        with metrics.request('consolidate') as timings:
+            with PeakMemoryMonitor(extra_pids=pool_worker_pids) as memory_monitor:
+                all_products = extract_uploads(files)
+                
+                if not all_products:
+                    return jsonify({
+                        'success': False,
+                        'error': 'No se pudieron extraer productos de los archivos'
+                    }), 400
+                
+                consolidated, stats = consolidate_products(all_products, **options)
+                del all_products
+                
+                # Se guarda sin marketing para paginarlo después (GET /api/results/<id>)
+                result_id = result_cache.add(consolidated, stats)
+                with metrics.stage('marketing'):
+                    if output['query'].paged:
+                        result_set = result_cache.get(result_id) or ResultSet(None, consolidated, stats)
+                        result = results_page(result_set, output)
+                    else:
+                        result = {
+                            'success': True,
+                            'resultId': result_id,
+                            'consolidated': [present_product(product, output) for product in consolidated],
+                            'stats': stats
+                        }
+                del consolidated
             
-            consolidated_product = {
-                'consolidated_sku': f"CONS-{str(len(consolidated) + 1).zfill(4)}",
-                'description': best['description'],
-                'priceMenudeo': best['priceMenudeo'],
-                'priceCaja': best['priceCaja'],
-                'moq': best['moq'],
-                'category': best['category'],
-                'provider': best['provider'],
-                'num_providers': len(group),
-                'savings': savings,
-                'alternatives': [
-                    {
-                        'provider': p['provider'],
-                        'sku': p['sku'],
-                        'priceCaja': p['priceCaja']
-                    }
-                    for p in group
-                ],
-                # Campos optimizados para TikTok Shop
-                'optimizedTitle': optimized_title,
-                'optimizedDescription': optimized_description,
-                'hashtags': hashtags,
-                'suggestedRetailPrice': f"${suggested_retail_low:.2f} - ${suggested_retail_high:.2f}",
-                'profitMargin': "30-50%"
-            }
+            memory_report = memory_monitor.report()
+            timings.memory = memory_report
+            logger.info(f"🧠 Memoria: pico {memory_report['peakMB']} MB (+{memory_report['peakDeltaMB']} MB)")
             
-            consolidated.append(consolidated_product)
+            result['memory'] = memory_report
+            if PAGE_TRIAGE != 'off':
+                result['triage'] = triage_report(timings)
+            # El tiempo de serialización solo aparece en /metrics
+            if include_timings:
+                result['timings'] = timings.as_dict()
+            with metrics.stage('serialize'):
+                response = jsonify(result)
+        return response
         
-        # Limpiar grupos de memoria
-        del groups
-        del all_products
+    except Exception as e:
+        logger.exception(f"❌ Error: {str(e)}")
+        metrics.count('errors')
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    finally:
+        # **OPTIMIZACIÓN 8: Siempre limpiar al final**
         gc.collect()
-        
-        # Ordenar por categoría
-        consolidated.sort(key=lambda x: x['category'])
-        
-        # Calcular estadísticas
-        stats = {
-            'totalProducts': len(consolidated),
-            'totalSavings': round(sum(p['savings'] for p in consolidated), 2),
-            'duplicateProducts': len([p for p in consolidated if p['num_providers'] > 1]),
-            'avgProviders': round(sum(p['num_providers'] for p in consolidated) / len(consolidated), 1) if consolidated else 0
-        }
-        
-        print(f"✅ Consolidación completa: {stats['totalProducts']} productos únicos")
-        
+
+@app.route('/api/jobs', methods=['POST'])
+def create_consolidation_job():
+    """
+    Encola una consolidación y devuelve el id del trabajo de inmediato
+    """
+    files = request.files.getlist('files')
+    if not files:
         return jsonify({
-            'success': True,
-            'consolidated': consolidated,
-            'stats': stats
+            'success': False,
+            'error': 'No se enviaron archivos'
+        }), 400
+    
+    options, error = parse_consolidation_options(request.form)
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+    
+    job_queue.fail_orphans()
+    job_store.purge(time.time() - JOB_TTL_SECONDS)
+    
+    # Guardar los archivos en disco: el trabajo sobrevive a la petición
+    job_dir = tempfile.mkdtemp(prefix='catalog-job-')
+    saved = []
+    for idx, file in enumerate(files):
+        path = os.path.join(job_dir, f"{idx}{os.path.splitext(file.filename.lower())[1]}")
+        file.save(path)
+        saved.append((file.filename, path))
+    
+    job = new_job([name for name, _path in saved], options)
+    try:
+        job_queue.submit(job, {
+            'files': saved, 'options': options, 'dir': job_dir,
+            'timings': wants_timings(request.values),
         })
-        
+    except queue.Full:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        return jsonify({
+            'success': False,
+            'error': 'Demasiados trabajos en cola, intenta más tarde'
+        }), 503
+    
+    logger.info(f"🧾 Trabajo {job['id']} encolado ({len(saved)} archivos)")
+    return jsonify({
+        'success': True,
+        'jobId': job['id'],
+        'status': job['status'],
+        'statusUrl': f"/api/jobs/{job['id']}",
+        'resultsUrl': f"/api/jobs/{job['id']}/results"
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_consolidation_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Trabajo no encontrado'
+        }), 404
+    
+    files_done = sum(1 for f in job['files'] if f['status'] in ('done', 'skipped', 'failed'))
+    job['progress'] = {
+        'filesDone': files_done,
+        'filesTotal': len(job['files']),
+        'pagesDone': sum(f['pagesDone'] for f in job['files']),
+        'pagesTotal': sum(f['pagesTotal'] or 0 for f in job['files']),
+    }
+    return jsonify({'success': True, 'job': job}), 200
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+def get_consolidation_job_results(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Trabajo no encontrado'
+        }), 404
+    
+    if job['status'] == JOB_FAILED:
+        return jsonify({
+            'success': False,
+            'status': job['status'],
+            'error': job['error']
+        }), 500
+    
+    if job['status'] != JOB_DONE:
+        return jsonify({
+            'success': False,
+            'status': job['status'],
+            'error': 'El trabajo aún no termina'
+        }), 202
+    
+    output, error = parse_output_request(request.values)
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+    
+    # El resultado guardado no lleva el contenido de marketing: se genera
+    # sobre copias en cada consulta
+    result = job_store.get_result(job_id)
+    if output['query'].paged:
+        result_set = result_cache.get(job_id) or ResultSet(job_id, result['consolidated'], result['stats'])
+        return jsonify(results_page(result_set, output)), 200
+    result = dict(result)
+    result['consolidated'] = [present_product(product, output) for product in result['consolidated']]
+    return jsonify(result), 200
+
+@app.route('/api/results/<result_id>', methods=['GET'])
+def get_consolidation_results(result_id):
+    """
+    Página de un resultado guardado ('latest' = la última consolidación),
+    con filtros y proyección. Siempre paginado (limit por default RESULT_PAGE_LIMIT).
+    """
+    output, error = parse_output_request(request.values)
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+    result_set = result_cache.get(result_id)
+    if result_set is None:
+        return jsonify({
+            'success': False,
+            'error': 'Resultado no encontrado o expirado'
+        }), 404
+    return jsonify(results_page(result_set, output)), 200
+
+product_store = ProductStore(PRODUCT_DB_PATH, build_consolidated_product, hash_engine.version)
+if product_store.stale_products():
+    logger.warning(
+        f"⚠️ Índice de catálogos: {product_store.stale_products()} productos con otra versión de hash "
+        f"(distinta de {hash_engine.version}); no se agrupan hasta volver a subir esos catálogos"
+    )
+
+@app.route('/api/catalogs', methods=['GET'])
+def list_catalogs():
+    return jsonify({'success': True, 'providers': product_store.providers()}), 200
+
+@app.route('/api/catalogs/<provider>', methods=['POST', 'PUT'])
+def upsert_catalog(provider):
+    """
+    POST agrega productos al catálogo del proveedor; PUT lo reemplaza completo.
+    Solo se recalculan los grupos afectados.
+    """
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({
+            'success': False,
+            'error': 'No se enviaron archivos'
+        }), 400
+    
+    try:
+        products = extract_uploads(files, provider=provider)
+        # Una extracción vacía (archivo ilegible o no soportado) nunca borra
+        # el catálogo guardado; para quitarlo está DELETE
+        if not products:
+            return jsonify({
+                'success': False,
+                'error': 'No se pudieron extraer productos de los archivos'
+            }), 400
+        if request.method == 'PUT':
+            refreshed = product_store.replace_catalog(provider, products)
+        else:
+            refreshed = product_store.add_products(provider, products)
     except Exception as e:
-        print(f"❌ Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Error actualizando catálogo {provider}: {e}")
+        metrics.count('errors')
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
     finally:
-        # **OPTIMIZACIÓN 8: Siempre limpiar al final**
         gc.collect()
+    
+    logger.info(f"🗂️ Catálogo {provider}: {len(products)} productos, {refreshed} grupos recalculados")
+    return jsonify({
+        'success': True,
+        'provider': provider,
+        'products': len(products),
+        'groupsRefreshed': refreshed,
+        'stats': product_store.stats()
+    }), 200
+
+@app.route('/api/catalogs/<provider>', methods=['DELETE'])
+def delete_catalog(provider):
+    refreshed = product_store.remove_catalog(provider)
+    return jsonify({
+        'success': True,
+        'provider': provider,
+        'groupsRefreshed': refreshed,
+        'stats': product_store.stats()
+    }), 200
+
+@app.route('/api/catalogs/consolidated', methods=['GET'])
+def get_catalog_consolidation():
+    """
+    Consolidación de todos los catálogos guardados (mismo formato que /api/consolidate)
+    """
+    marketing_fields, error = parse_marketing_request(request.values)
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+    return jsonify({
+        'success': True,
+        'consolidated': [
+            render_marketing(product, marketing_fields) for product in product_store.iter_consolidated()
+        ],
+        'stats': product_store.stats()
+    }), 200
+
+@app.route('/api/catalogs/best/<image_hash>', methods=['GET'])
+def get_best_price(image_hash):
+    marketing_fields, error = parse_marketing_request(request.values)
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+    product = product_store.best_for_hash(image_hash.lower())
+    if product is None:
+        return jsonify({
+            'success': False,
+            'error': 'Hash no encontrado'
+        }), 404
+    return jsonify({'success': True, 'product': render_marketing(product, marketing_fields)}), 200
+
+def warm_up():
+    """
+    Ejecuta una vez las rutas de hash, PDF y Excel con documentos mínimos en
+    memoria: Pillow registra sus decodificadores, SciPy carga la DCT y
+    PyMuPDF/openpyxl cargan sus módulos internos. Así la primera petición no
+    paga esas cargas; con gunicorn (preload_app) corre en el master antes
+    del fork. No toca métricas, cachés ni el memo de hashes.
+    """
+    start = time.perf_counter()
+    samples = []
+    for image_format in ('JPEG', 'PNG'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, image_format)
+        samples.append(buffer.getvalue())
+    hash_engine.hash_many(samples)
+    
+    with fitz.open() as pdf_document:
+        page = pdf_document.new_page()
+        page.insert_image(fitz.Rect(0, 0, 64, 64), stream=samples[0])
+        page.insert_text((80, 40), 'SKU-1 120 PIEZA')
+        page.get_text("blocks")
+        page.get_image_info()
+        for img in page.get_images(full=True):
+            pdf_document.extract_image(img[0])
+    
+    buffer = io.BytesIO()
+    wb = Workbook()
+    wb.active.append(['SKU', 'DESCRIPCION', 'PRECIO'])
+    wb.save(buffer)
+    wb.close()
+    for read_only in (True, False):
+        buffer.seek(0)
+        wb = load_workbook(buffer, read_only=read_only, data_only=True)
+        list(wb.active.iter_rows(values_only=True))
+        wb.close()
+    
+    logger.info(f"🔥 Warm-up en {time.perf_counter() - start:.2f} s")
 
 if __name__ == '__main__':
+    # Servidor de desarrollo; en producción: gunicorn -c gunicorn.conf.py
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
+    app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_DEBUG', '0') == '1')
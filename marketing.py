@@ -0,0 +1,123 @@
+"""
+Contenido para TikTok Shop de los productos consolidados: título,
+descripción, hashtags y precio de venta sugerido.
+
+Es un paso aparte de la consolidación. Las plantillas y los hashtags por
+categoría se preparan una sola vez al importar el módulo, y el texto se
+genera al armar la respuesta, solo para los productos que se devuelven y
+solo para los campos pedidos (parámetro `marketing`).
+"""
+
+MARKETING_FIELDS = (
+    'optimizedTitle',
+    'optimizedDescription',
+    'hashtags',
+    'suggestedRetailPrice',
+    'profitMargin',
+)
+
+TITLE_MAX_CHARS = 60  # Título optimizado (máx 60 caracteres)
+
+DESCRIPTION_TEMPLATE = """✨ {description}
+
+🎯 CARACTERÍSTICAS:
+• Categoría: {category}
+• MOQ: {moq} piezas
+• Disponible con múltiples proveedores
+
+💰 PRECIO:
+• Menudeo: ${priceMenudeo:.2f}
+• Por Caja: ${priceCaja:.2f}
+
+📦 Envíos disponibles
+✅ Calidad garantizada
+🚀 Entrega rápida"""
+
+BASE_HASHTAGS = '#tiktokshop #mayoreo #preciosmayoreo #ventasonline'
+
+CATEGORY_HASHTAGS = {
+    'ROPA Y ACCESORIOS': '#fashion #accesorios #moda #estilo',
+    'DECORACION': '#decoracion #hogar #navidad #luces',
+    'EMPAQUES Y REGALOS': '#regalo #empaque #bolsas #packaging',
+    'ELECTRONICA': '#tech #electronica #gadgets #led',
+    'GENERAL': '#productos #mayoreo #ventas'
+}
+
+# Margen sugerido (30-50%)
+RETAIL_MARKUP_LOW = 1.3
+RETAIL_MARKUP_HIGH = 1.5
+PROFIT_MARGIN = "30-50%"
+
+_format_description = DESCRIPTION_TEMPLATE.format
+_hashtags = {
+    category: f"{BASE_HASHTAGS} {tags}" for category, tags in CATEGORY_HASHTAGS.items()
+}
+_default_hashtags = f"{BASE_HASHTAGS} #productos"
+
+
+def _clean_description(product):
+    return product['description'][:60].strip()
+
+
+def _title(product):
+    return f"{_clean_description(product)} | {product['category']}"[:TITLE_MAX_CHARS]
+
+
+def _description(product):
+    return _format_description(
+        description=_clean_description(product),
+        category=product['category'],
+        moq=product['moq'],
+        priceMenudeo=product['priceMenudeo'],
+        priceCaja=product['priceCaja'],
+    )
+
+
+def _hashtags_for(product):
+    return _hashtags.get(product['category'], _default_hashtags)
+
+
+def _suggested_retail_price(product):
+    low = round(product['priceCaja'] * RETAIL_MARKUP_LOW, 2)
+    high = round(product['priceCaja'] * RETAIL_MARKUP_HIGH, 2)
+    return f"${low:.2f} - ${high:.2f}"
+
+
+def _profit_margin(product):
+    return PROFIT_MARGIN
+
+
+_RENDERERS = {
+    'optimizedTitle': _title,
+    'optimizedDescription': _description,
+    'hashtags': _hashtags_for,
+    'suggestedRetailPrice': _suggested_retail_price,
+    'profitMargin': _profit_margin,
+}
+
+
+def parse_marketing_fields(value):
+    """
+    Campos a generar: 'all' (todos), 'none' (ninguno) o nombres separados
+    por comas. Lanza ValueError si algún campo no existe.
+    """
+    value = (value or 'all').strip()
+    if value.lower() == 'all':
+        return MARKETING_FIELDS
+    if value.lower() == 'none':
+        return ()
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = sorted(requested - set(MARKETING_FIELDS))
+    if unknown:
+        raise ValueError(f"Campos de marketing inválidos: {', '.join(unknown)}")
+    # Siempre en el orden de MARKETING_FIELDS
+    return tuple(name for name in MARKETING_FIELDS if name in requested)
+
+
+def render_marketing(product, fields=MARKETING_FIELDS):
+    """
+    Agrega al producto consolidado (en el mismo dict) los campos pedidos
+    """
+    for name in fields:
+        product[name] = _RENDERERS[name](product)
+    return product
@@ -0,0 +1,77 @@
+"""
+Medición de memoria (RSS) por petición.
+
+ru_maxrss es el pico de toda la vida del proceso, así que no sirve para saber
+cuánto usó una petición concreta. PeakMemoryMonitor muestrea el RSS en un
+hilo mientras dura la petición y guarda el máximo observado.
+"""
+import os
+import resource
+import threading
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+MB = 1024 * 1024
+
+
+def rss_bytes(pid='self'):
+    """
+    RSS actual de un proceso en bytes (0 si no se puede leer)
+    """
+    try:
+        with open(f"/proc/{pid}/statm", 'r') as fh:
+            return int(fh.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        if pid != 'self':
+            return 0
+        # Sin /proc (macOS): usar el pico del proceso como aproximación
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname().sysname == 'Darwin' else maxrss * 1024
+
+
+class PeakMemoryMonitor:
+    """
+    Context manager que registra el RSS inicial y el pico durante el bloque.
+    extra_pids() puede devolver pids adicionales (p. ej. workers del pool)
+    cuyo RSS se suma al del proceso actual.
+    """
+
+    def __init__(self, interval=0.02, extra_pids=None):
+        self.interval = interval
+        self.extra_pids = extra_pids
+        self.start_bytes = 0
+        self.peak_bytes = 0
+        self.end_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        total = rss_bytes()
+        if self.extra_pids is not None:
+            for pid in self.extra_pids():
+                total += rss_bytes(pid)
+        if total > self.peak_bytes:
+            self.peak_bytes = total
+        return total
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.start_bytes = self.sample()
+        self._thread = threading.Thread(target=self._run, name='memory-monitor', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.end_bytes = self.sample()
+        return False
+
+    def report(self):
+        return {
+            'startMB': round(self.start_bytes / MB, 1),
+            'peakMB': round(self.peak_bytes / MB, 1),
+            'peakDeltaMB': round((self.peak_bytes - self.start_bytes) / MB, 1),
+        }
@@ -0,0 +1,258 @@
+"""
+Métricas de las etapas del procesamiento en formato Prometheus.
+
+Cada etapa (extract_image, decode, phash, row_match, grouping, ...) acumula
+su tiempo total y número de llamadas; los contadores cuentan páginas,
+imágenes, errores, etc. Si hay una petición activa (Metrics.request) lo
+mismo se acumula también en su desglose, que se puede devolver en la
+respuesta. Los workers del pool devuelven su desglose y el proceso web lo
+suma con merge().
+
+Con varios procesos web (workers de gunicorn) se indica un directorio
+compartido: cada proceso escribe ahí su snapshot al terminar cada petición
+y render() suma los de todos, así que cualquier worker responde los mismos
+contadores (y los de workers ya reciclados se conservan).
+"""
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+REQUEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current_request = contextvars.ContextVar('current_request', default=None)
+
+
+class RequestTimings:
+    """
+    Desglose de una petición: segundos por etapa y contadores
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.memory = None  # Reporte de PeakMemoryMonitor, si se midió
+
+    def as_dict(self):
+        return {
+            'totalSeconds': round(time.perf_counter() - self.started, 4),
+            'stages': {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            'counters': dict(self.counters),
+        }
+
+
+class Metrics:
+    """
+    Registro de métricas del proceso (seguro entre hilos)
+    """
+
+    def __init__(self, prefix='catalog', directory=None):
+        self.prefix = prefix
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._owner_pid = None
+        self._snapshot_name = None
+        self._stage_seconds = {}
+        self._stage_calls = {}
+        self._counters = {}
+        self._requests = {}  # endpoint -> [cuentas por bucket, suma, total]
+        self._last_peak_bytes = 0
+        self._max_peak_bytes = 0
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Mide el bloque como una llamada a la etapa indicada
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def add_stage(self, name, seconds, calls=1):
+        with self._lock:
+            self._stage_seconds[name] = self._stage_seconds.get(name, 0.0) + seconds
+            self._stage_calls[name] = self._stage_calls.get(name, 0) + calls
+        timings = _current_request.get()
+        if timings is not None:
+            timings.stages[name] = timings.stages.get(name, 0.0) + seconds
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        timings = _current_request.get()
+        if timings is not None:
+            timings.counters[name] = timings.counters.get(name, 0) + value
+
+    def current_count(self, name):
+        """
+        Valor del contador en la petición activa (o en el proceso si no hay)
+        """
+        timings = _current_request.get()
+        if timings is not None:
+            return timings.counters.get(name, 0)
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def merge(self, breakdown):
+        """
+        Suma el desglose (RequestTimings.as_dict) de otro proceso
+        """
+        for name, seconds in breakdown['stages'].items():
+            self.add_stage(name, seconds, calls=0)
+        for name, value in breakdown['counters'].items():
+            self.count(name, value)
+
+    @contextmanager
+    def request(self, endpoint):
+        """
+        Activa el desglose por petición; al salir registra la duración y,
+        si se asignó timings.memory, el pico de memoria
+        """
+        timings = RequestTimings(endpoint)
+        token = _current_request.set(timings)
+        try:
+            yield timings
+        finally:
+            _current_request.reset(token)
+            elapsed = time.perf_counter() - timings.started
+            with self._lock:
+                histogram = self._requests.setdefault(endpoint, [[0] * len(REQUEST_BUCKETS), 0.0, 0])
+                for i, bound in enumerate(REQUEST_BUCKETS):
+                    if elapsed <= bound:
+                        histogram[0][i] += 1
+                histogram[1] += elapsed
+                histogram[2] += 1
+                if timings.memory is not None:
+                    peak = int(timings.memory['peakMB'] * 1024 * 1024)
+                    self._last_peak_bytes = peak
+                    self._max_peak_bytes = max(self._max_peak_bytes, peak)
+            self.publish()
+
+    def disable_sharing(self):
+        """
+        Para procesos cuyo desglose ya suma otro proceso (workers del pool)
+        """
+        self.directory = None
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'updated': time.time(),
+                'stageSeconds': dict(self._stage_seconds),
+                'stageCalls': dict(self._stage_calls),
+                'counters': dict(self._counters),
+                'requests': {
+                    endpoint: [list(buckets), total_seconds, total]
+                    for endpoint, (buckets, total_seconds, total) in self._requests.items()
+                },
+                'lastPeakBytes': self._last_peak_bytes,
+                'maxPeakBytes': self._max_peak_bytes,
+            }
+
+    def publish(self):
+        """
+        Escribe el snapshot de este proceso en el directorio compartido
+        """
+        if not self.directory:
+            return
+        pid = os.getpid()
+        if self._owner_pid != pid:
+            # Nombre único por proceso: un pid reutilizado no pisa a un worker anterior
+            self._owner_pid = pid
+            self._snapshot_name = f"{pid}-{uuid.uuid4().hex[:8]}.json"
+        data = json.dumps(self.snapshot())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as fh:
+                fh.write(data)
+            os.replace(tmp_path, os.path.join(self.directory, self._snapshot_name))
+        except OSError:
+            pass
+
+    def _combined(self):
+        """
+        Snapshot de este proceso o, con directorio compartido, la suma de todos
+        """
+        if not self.directory:
+            return self.snapshot()
+        self.publish()
+        total = {
+            'stageSeconds': {}, 'stageCalls': {}, 'counters': {}, 'requests': {},
+            'lastPeakBytes': 0, 'maxPeakBytes': 0,
+        }
+        latest = 0
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            names = []
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as fh:
+                    snapshot = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            for key in ('stageSeconds', 'stageCalls', 'counters'):
+                for metric, value in snapshot[key].items():
+                    total[key][metric] = total[key].get(metric, 0) + value
+            for endpoint, (buckets, total_seconds, count) in snapshot['requests'].items():
+                histogram = total['requests'].setdefault(endpoint, [[0] * len(REQUEST_BUCKETS), 0.0, 0])
+                histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+                histogram[1] += total_seconds
+                histogram[2] += count
+            total['maxPeakBytes'] = max(total['maxPeakBytes'], snapshot['maxPeakBytes'])
+            if snapshot['lastPeakBytes'] and snapshot['updated'] >= latest:
+                latest = snapshot['updated']
+                total['lastPeakBytes'] = snapshot['lastPeakBytes']
+        return total
+
+    def render(self, gauges=None):
+        """
+        Texto en formato de exposición de Prometheus. gauges es un dict
+        opcional {nombre: valor} con valores leídos al momento (del proceso
+        que responde)
+        """
+        p = self.prefix
+        data = self._combined()
+        lines = []
+        lines.append(f"# HELP {p}_stage_seconds_total Tiempo acumulado por etapa")
+        lines.append(f"# TYPE {p}_stage_seconds_total counter")
+        for name, seconds in sorted(data['stageSeconds'].items()):
+            lines.append(f'{p}_stage_seconds_total{{stage="{name}"}} {seconds:.6f}')
+        lines.append(f"# HELP {p}_stage_calls_total Llamadas por etapa (en los procesos web)")
+        lines.append(f"# TYPE {p}_stage_calls_total counter")
+        for name, calls in sorted(data['stageCalls'].items()):
+            lines.append(f'{p}_stage_calls_total{{stage="{name}"}} {calls}')
+
+        for name, value in sorted(data['counters'].items()):
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            lines.append(f"{p}_{name}_total {value}")
+
+        lines.append(f"# HELP {p}_request_duration_seconds Duración de las peticiones")
+        lines.append(f"# TYPE {p}_request_duration_seconds histogram")
+        for endpoint, (buckets, total_seconds, total) in sorted(data['requests'].items()):
+            for bound, count in zip(REQUEST_BUCKETS, buckets):
+                lines.append(f'{p}_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+            lines.append(f'{p}_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {total}')
+            lines.append(f'{p}_request_duration_seconds_sum{{endpoint="{endpoint}"}} {total_seconds:.6f}')
+            lines.append(f'{p}_request_duration_seconds_count{{endpoint="{endpoint}"}} {total}')
+
+        lines.append(f"# TYPE {p}_request_peak_rss_bytes gauge")
+        lines.append(f"{p}_request_peak_rss_bytes {data['lastPeakBytes']}")
+        lines.append(f"# TYPE {p}_request_max_peak_rss_bytes gauge")
+        lines.append(f"{p}_request_max_peak_rss_bytes {data['maxPeakBytes']}")
+
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE {p}_{name} gauge")
+            lines.append(f"{p}_{name} {value}")
+        return '\n'.join(lines) + '\n'
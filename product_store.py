@@ -0,0 +1,234 @@
+"""
+Índice persistente de productos (SQLite) para consolidar de forma incremental.
+
+Los productos extraídos se guardan por proveedor, y cada grupo (productos con
+el mismo hash de imagen) se guarda ya consolidado. Al agregar, reemplazar o
+quitar el catálogo de un proveedor solo se recalculan los grupos cuyos hashes
+cambiaron; las estadísticas salen de agregados SQL sobre la tabla de grupos.
+
+Un producto se identifica por (proveedor, SKU, hash de imagen): volver a
+subir el mismo producto lo actualiza en lugar de duplicarlo. Cada fila guarda
+la versión del motor de hash que la calculó; las filas de otra versión (por
+ejemplo, tras cambiar HASH_ENGINE o FINGERPRINT) no se agrupan con las
+actuales y quedan como obsoletas hasta volver a subir ese catálogo.
+"""
+import json
+import sqlite3
+import threading
+
+PRODUCT_COLUMNS = ('sku', 'description', 'priceMenudeo', 'priceCaja', 'moq', 'category', 'image_hash')
+
+
+class ProductStore:
+    """
+    build_group(productos, número) construye el producto consolidado de un
+    grupo (el número es el id estable del grupo, usado en consolidated_sku).
+    hash_version es la versión del motor de hash de los productos que llegan.
+    """
+
+    def __init__(self, path, build_group, hash_version):
+        self.path = path
+        self.build_group = build_group
+        self.hash_version = hash_version
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(
+                'CREATE TABLE IF NOT EXISTS products ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                ' provider TEXT NOT NULL,'
+                ' sku TEXT NOT NULL,'
+                ' description TEXT NOT NULL,'
+                ' priceMenudeo REAL NOT NULL,'
+                ' priceCaja REAL NOT NULL,'
+                ' moq INTEGER NOT NULL,'
+                ' category TEXT NOT NULL,'
+                ' image_hash TEXT NOT NULL,'
+                ' hash_version TEXT NOT NULL);'
+                'CREATE INDEX IF NOT EXISTS products_hash ON products (image_hash);'
+                'CREATE TABLE IF NOT EXISTS groups ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                ' image_hash TEXT NOT NULL UNIQUE,'
+                ' category TEXT,'
+                ' num_providers INTEGER,'
+                ' savings REAL,'
+                ' data TEXT);'
+                'CREATE INDEX IF NOT EXISTS groups_category ON groups (category, id);'
+                'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);'
+            )
+            self._migrate(conn)
+
+    def _migrate(self, conn):
+        """
+        Lleva un índice creado por una versión anterior al esquema actual y
+        reconstruye los grupos si cambió la versión del motor de hash
+        """
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(products)')}
+        if 'hash_version' not in columns:
+            # Versión desconocida: esas filas quedan como obsoletas
+            conn.execute("ALTER TABLE products ADD COLUMN hash_version TEXT NOT NULL DEFAULT ''")
+        indexes = {row['name'] for row in conn.execute('PRAGMA index_list(products)')}
+        if 'products_key' not in indexes:
+            conn.execute('DROP INDEX IF EXISTS products_provider')
+            # Quitar duplicados (se queda la fila más reciente) antes de la llave única
+            conn.execute(
+                'DELETE FROM products WHERE id NOT IN ('
+                ' SELECT MAX(id) FROM products GROUP BY provider, sku, image_hash, hash_version)'
+            )
+            conn.execute(
+                'CREATE UNIQUE INDEX products_key ON products (provider, sku, image_hash, hash_version)'
+            )
+
+        row = conn.execute("SELECT value FROM meta WHERE key = 'hash_version'").fetchone()
+        if row is None or row['value'] != self.hash_version:
+            # Los grupos guardados se calcularon con otra versión (o con duplicados)
+            conn.execute('DELETE FROM groups')
+            hashes = conn.execute(
+                'SELECT DISTINCT image_hash FROM products WHERE hash_version = ?', (self.hash_version,)
+            ).fetchall()
+            self._refresh_groups(conn, {row['image_hash'] for row in hashes})
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('hash_version', ?)", (self.hash_version,)
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _hashes_of(self, conn, provider):
+        rows = conn.execute(
+            'SELECT DISTINCT image_hash FROM products WHERE provider = ? AND hash_version = ?',
+            (provider, self.hash_version),
+        ).fetchall()
+        return {row['image_hash'] for row in rows}
+
+    def _upsert(self, conn, provider, products):
+        # Mismo proveedor, SKU y hash: se actualizan los datos (conserva el id)
+        conn.executemany(
+            'INSERT INTO products'
+            ' (provider, sku, description, priceMenudeo, priceCaja, moq, category, image_hash, hash_version)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+            ' ON CONFLICT (provider, sku, image_hash, hash_version) DO UPDATE SET'
+            ' description = excluded.description, priceMenudeo = excluded.priceMenudeo,'
+            ' priceCaja = excluded.priceCaja, moq = excluded.moq, category = excluded.category',
+            [(provider, *(p[column] for column in PRODUCT_COLUMNS), self.hash_version) for p in products],
+        )
+        return {p['image_hash'] for p in products}
+
+    def _refresh_groups(self, conn, hashes):
+        """
+        Recalcula solo los grupos de los hashes indicados
+        """
+        for image_hash in hashes:
+            rows = conn.execute(
+                'SELECT * FROM products WHERE image_hash = ? AND hash_version = ? ORDER BY id',
+                (image_hash, self.hash_version),
+            ).fetchall()
+            if not rows:
+                conn.execute('DELETE FROM groups WHERE image_hash = ?', (image_hash,))
+                continue
+
+            group = [dict(row) for row in rows]
+            for product in group:
+                del product['id']
+                del product['hash_version']
+
+            row = conn.execute('SELECT id FROM groups WHERE image_hash = ?', (image_hash,)).fetchone()
+            if row is None:
+                group_id = conn.execute(
+                    'INSERT INTO groups (image_hash) VALUES (?)', (image_hash,)
+                ).lastrowid
+            else:
+                group_id = row['id']
+
+            consolidated = self.build_group(group, group_id)
+            conn.execute(
+                'UPDATE groups SET category = ?, num_providers = ?, savings = ?, data = ? WHERE id = ?',
+                (
+                    consolidated['category'], consolidated['num_providers'], consolidated['savings'],
+                    json.dumps(consolidated, ensure_ascii=False), group_id,
+                ),
+            )
+        return len(hashes)
+
+    def add_products(self, provider, products):
+        """
+        Agrega productos al catálogo de un proveedor. Devuelve grupos recalculados.
+        """
+        with self._lock, self._connect() as conn:
+            affected = self._upsert(conn, provider, products)
+            return self._refresh_groups(conn, affected)
+
+    def replace_catalog(self, provider, products):
+        """
+        Reemplaza el catálogo completo de un proveedor. Devuelve grupos recalculados.
+        """
+        with self._lock, self._connect() as conn:
+            affected = self._hashes_of(conn, provider)
+            # También se descartan las filas obsoletas (de otra versión de hash)
+            conn.execute('DELETE FROM products WHERE provider = ?', (provider,))
+            affected |= self._upsert(conn, provider, products)
+            return self._refresh_groups(conn, affected)
+
+    def remove_catalog(self, provider):
+        """
+        Quita el catálogo de un proveedor. Devuelve grupos recalculados.
+        """
+        with self._lock, self._connect() as conn:
+            affected = self._hashes_of(conn, provider)
+            conn.execute('DELETE FROM products WHERE provider = ?', (provider,))
+            return self._refresh_groups(conn, affected)
+
+    def providers(self):
+        """
+        Proveedores con sus productos vigentes y los obsoletos (otra versión de hash)
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT provider, SUM(hash_version = ?) AS products, SUM(hash_version != ?) AS staleProducts'
+                ' FROM products GROUP BY provider ORDER BY provider',
+                (self.hash_version, self.hash_version),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stale_products(self):
+        """
+        Filas guardadas con otra versión del motor de hash (no se agrupan)
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT COUNT(*) AS stale FROM products WHERE hash_version != ?', (self.hash_version,)
+            ).fetchone()
+        return row['stale']
+
+    def best_for_hash(self, image_hash):
+        """
+        Producto consolidado (mejor precio y alternativas) de un hash de imagen
+        """
+        with self._connect() as conn:
+            row = conn.execute('SELECT data FROM groups WHERE image_hash = ?', (image_hash,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def iter_consolidated(self):
+        """
+        Productos consolidados ordenados por categoría (y por antigüedad del grupo)
+        """
+        with self._connect() as conn:
+            for row in conn.execute('SELECT data FROM groups ORDER BY category, id'):
+                yield json.loads(row['data'])
+
+    def stats(self):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT COUNT(*) AS total, COALESCE(SUM(savings), 0) AS savings,'
+                ' COALESCE(SUM(num_providers > 1), 0) AS duplicates,'
+                ' COALESCE(SUM(num_providers), 0) AS providers FROM groups'
+            ).fetchone()
+        total = row['total']
+        return {
+            'totalProducts': total,
+            'totalSavings': round(row['savings'], 2),
+            'duplicateProducts': row['duplicates'],
+            'avgProviders': round(row['providers'] / total, 1) if total else 0
+        }
@@ -0,0 +1,168 @@
+"""
+Tabla columnar de productos para la etapa de consolidación.
+
+En lugar de un dict por producto, cada campo es una columna: el hash de
+imagen como uint64, precios y MOQ en arreglos NumPy, proveedor y categoría
+como códigos enteros de strings internados, y SKU/descripción en listas.
+La agrupación, el mejor precio, el ahorro y el orden por categoría se
+calculan con ordenamientos de NumPy; los dicts se construyen solo al
+generar la salida.
+
+Da exactamente los mismos grupos y el mismo orden que grouping.group_products
+más el sorted() por precio de cada grupo (empates: primero en aparecer).
+"""
+import numpy
+
+from grouping import cluster_hashes
+
+MAX_HASH_BITS = 64  # Los hashes se guardan en uint64
+
+
+class ProductTable:
+    """
+    Productos extraídos en columnas
+    """
+
+    def __init__(self, products):
+        count = len(products)
+        self.hashes = numpy.fromiter(
+            (int(p['image_hash'], 16) for p in products), dtype=numpy.uint64, count=count
+        )
+        self.price_menudeo = numpy.fromiter((p['priceMenudeo'] for p in products), dtype=numpy.float64, count=count)
+        self.price_caja = numpy.fromiter((p['priceCaja'] for p in products), dtype=numpy.float64, count=count)
+        self.moq = numpy.fromiter((p['moq'] for p in products), dtype=numpy.int64, count=count)
+        self.sku = [p['sku'] for p in products]
+        self.description = [p['description'] for p in products]
+        self.providers, self.provider_codes = _intern((p['provider'] for p in products), count)
+        self.categories, self.category_codes = _intern((p['category'] for p in products), count)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def group(self, mode='exact', threshold=0, bits=MAX_HASH_BITS, index='mih'):
+        """
+        Agrupa por hash (exacto o a distancia de Hamming <= umbral).
+        Los grupos quedan numerados en orden de primera aparición.
+        """
+        if len(self) == 0:
+            return ProductGroups(self, numpy.empty(0, dtype=numpy.int64), 0)
+
+        unique, first, inverse = numpy.unique(self.hashes, return_index=True, return_inverse=True)
+        # Posición de cada hash único en orden de primera aparición
+        appearance = numpy.argsort(first, kind='stable')
+        rank = numpy.empty(len(unique), dtype=numpy.int64)
+        rank[appearance] = numpy.arange(len(unique))
+
+        if mode == 'exact' or threshold <= 0:
+            return ProductGroups(self, rank[inverse], len(unique))
+
+        # El representante de cada grupo es su hash de menor posición, así que
+        # ordenar por representante conserva el orden de primera aparición
+        ordered = [int(value) for value in unique[appearance]]
+        roots = numpy.asarray(cluster_hashes(ordered, threshold, bits=bits, index=index), dtype=numpy.int64)
+        representatives, labels = numpy.unique(roots[rank[inverse]], return_inverse=True)
+        return ProductGroups(self, labels, len(representatives))
+
+
+class ProductGroups:
+    """
+    Resultado de ProductTable.group: miembros, mejor precio y ahorro por grupo
+    """
+
+    def __init__(self, table, labels, num_groups):
+        self.table = table
+        self.labels = labels
+        self.num_groups = num_groups
+        positions = numpy.arange(len(labels))
+
+        # Miembros de cada grupo contiguos y en orden original
+        self.members_order = numpy.argsort(labels, kind='stable')
+        self.counts = numpy.bincount(labels, minlength=num_groups)
+        self.starts = numpy.concatenate(([0], numpy.cumsum(self.counts)[:-1])).astype(numpy.int64)
+
+        # Dentro de cada grupo por precio y posición: el primero es el mejor y el último el más caro
+        by_price = numpy.lexsort((positions, table.price_caja, labels))
+        self.best = by_price[self.starts] if num_groups else by_price[:0]
+        max_price = table.price_caja[by_price[self.starts + self.counts - 1]] if num_groups else table.price_caja[:0]
+        # round() de Python (no numpy.round) para dar los mismos centavos que la ruta de dicts
+        self.savings = [
+            round(high - low, 2)
+            for high, low in zip(max_price.tolist(), table.price_caja[self.best].tolist())
+        ]
+
+    def __len__(self):
+        return self.num_groups
+
+    def materialize(self, group_indices):
+        """
+        Genera (g, mejor producto, alternativas, ahorro) para los grupos
+        indicados. Aquí se crean los dicts; las columnas se pasan a listas de
+        Python una sola vez en lugar de leer escalares de NumPy uno por uno.
+        """
+        table = self.table
+        sku = table.sku
+        description = table.description
+        categories = table.categories
+        price_caja = table.price_caja.tolist()
+        price_menudeo = table.price_menudeo.tolist()
+        moq = table.moq.tolist()
+        providers = [table.providers[code] for code in table.provider_codes.tolist()]
+        category_codes = table.category_codes.tolist()
+        members_order = self.members_order.tolist()
+        starts = self.starts.tolist()
+        counts = self.counts.tolist()
+        best_rows = self.best.tolist()
+        savings = self.savings
+
+        for g in group_indices:
+            i = best_rows[g]
+            best = {
+                'sku': sku[i],
+                'description': description[i],
+                'priceMenudeo': price_menudeo[i],
+                'priceCaja': price_caja[i],
+                'moq': moq[i],
+                'category': categories[category_codes[i]],
+                'provider': providers[i],
+            }
+            alternatives = [
+                {'provider': providers[j], 'sku': sku[j], 'priceCaja': price_caja[j]}
+                for j in members_order[starts[g]:starts[g] + counts[g]]
+            ]
+            yield g, best, alternatives, savings[g]
+
+    def stats(self, group_indices):
+        """
+        Mismas estadísticas que ConsolidationStats, calculadas sobre las
+        columnas (el ahorro se suma en el orden dado, igual que la salida)
+        """
+        total = self.num_groups
+        savings = self.savings
+        return {
+            'totalProducts': total,
+            'totalSavings': round(sum((savings[g] for g in group_indices), 0.0), 2),
+            'duplicateProducts': int(numpy.count_nonzero(self.counts > 1)),
+            'avgProviders': round(int(self.counts.sum()) / total, 1) if total else 0,
+        }
+
+    def by_category(self):
+        """
+        Índices de grupo ordenados por la categoría de su mejor producto (estable)
+        """
+        table = self.table
+        names = table.categories
+        rank = numpy.empty(len(names), dtype=numpy.int64)
+        rank[sorted(range(len(names)), key=names.__getitem__)] = numpy.arange(len(names))
+        keys = rank[table.category_codes[self.best]]
+        return numpy.argsort(keys, kind='stable')
+
+
+def _intern(values, count):
+    """
+    Strings repetidos -> (nombres, códigos int32)
+    """
+    index = {}
+    codes = numpy.fromiter(
+        (index.setdefault(value, len(index)) for value in values), dtype=numpy.int32, count=count
+    )
+    return list(index), codes
@@ -0,0 +1,282 @@
+"""
+Resultados de consolidación guardados para paginarlos y filtrarlos.
+
+Cada consolidación (ya ordenada por categoría) se guarda como un ResultSet
+con columnas NumPy de los campos filtrables: categoría y proveedor como
+códigos, número de proveedores y ahorro. Un filtro se resuelve con máscaras
+sobre esas columnas y las posiciones resultantes se recuerdan, así que ir
+por las páginas de un mismo filtro solo corta una lista.
+
+El cursor es la posición (en el resultado completo) del siguiente producto,
+por lo que sigue siendo válido para cualquier filtro sobre el mismo
+resultado.
+
+ResultCache guarda los resultados en la memoria del proceso;
+SQLiteResultCache los guarda en SQLite para que cualquier worker de gunicorn
+responda cualquier id (y el mismo 'latest'), y recuerda en memoria los que
+ya cargó.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy
+
+FILTERED_POSITIONS_CACHE = 16  # Filtros recordados por resultado
+
+
+class ResultQuery:
+    """
+    Filtros y página pedidos en la query (category, provider, min_providers,
+    min_savings, page, limit, cursor)
+    """
+
+    PARAMS = ('category', 'provider', 'min_providers', 'min_savings', 'page', 'limit', 'cursor')
+
+    def __init__(self, category=None, provider=None, min_providers=None, min_savings=None,
+                 page=1, limit=50, cursor=None, paged=True):
+        self.category = category
+        self.provider = provider
+        self.min_providers = min_providers
+        self.min_savings = min_savings
+        self.page = page
+        self.limit = limit
+        self.cursor = cursor
+        self.paged = paged  # False: se pidió el resultado completo
+
+    @classmethod
+    def from_values(cls, values, default_limit, max_limit):
+        """
+        Lee la query; lanza ValueError con un mensaje para el cliente
+        """
+        def number(name, kind, minimum):
+            raw = values.get(name)
+            if raw in (None, ''):
+                return None
+            try:
+                value = kind(raw)
+            except ValueError:
+                raise ValueError(f"El parámetro {name} debe ser numérico") from None
+            if value < minimum:
+                raise ValueError(f"El parámetro {name} debe ser >= {minimum}")
+            return value
+
+        limit = number('limit', int, 1)
+        return cls(
+            category=values.get('category') or None,
+            provider=values.get('provider') or None,
+            min_providers=number('min_providers', int, 1),
+            min_savings=number('min_savings', float, 0),
+            page=number('page', int, 1) or 1,
+            limit=min(limit or default_limit, max_limit),
+            cursor=number('cursor', int, 0),
+            paged=any(values.get(name) not in (None, '') for name in cls.PARAMS),
+        )
+
+    def filter_key(self):
+        return (self.category, self.provider, self.min_providers, self.min_savings)
+
+
+class ResultSet:
+    """
+    Productos consolidados de una consolidación, en el orden de la respuesta
+    """
+
+    def __init__(self, result_id, consolidated, stats):
+        self.result_id = result_id
+        self.products = consolidated
+        self.stats = stats
+        self.created = time.time()
+
+        count = len(consolidated)
+        self.num_providers = numpy.fromiter(
+            (p['num_providers'] for p in consolidated), dtype=numpy.int64, count=count
+        )
+        self.savings = numpy.fromiter((p['savings'] for p in consolidated), dtype=numpy.float64, count=count)
+        self.category_codes, self.categories = _codes(p['category'] for p in consolidated)
+
+        # Proveedor -> posiciones de los productos que ofrece (mejor precio o alternativa)
+        by_provider = {}
+        for position, product in enumerate(consolidated):
+            for alternative in product['alternatives']:
+                positions = by_provider.setdefault(alternative['provider'], [])
+                if not positions or positions[-1] != position:
+                    positions.append(position)
+        self.provider_positions = {
+            name: numpy.asarray(positions, dtype=numpy.int64) for name, positions in by_provider.items()
+        }
+
+        self._filtered = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.products)
+
+    def positions(self, query):
+        """
+        Posiciones (ordenadas) de los productos que pasan los filtros
+        """
+        key = query.filter_key()
+        with self._lock:
+            cached = self._filtered.get(key)
+            if cached is not None:
+                self._filtered.move_to_end(key)
+                return cached
+
+        mask = numpy.ones(len(self.products), dtype=bool)
+        if query.category is not None:
+            code = self.categories.get(query.category)
+            mask &= self.category_codes == (code if code is not None else -1)
+        if query.provider is not None:
+            offered = numpy.zeros(len(self.products), dtype=bool)
+            offered[self.provider_positions.get(query.provider, numpy.empty(0, dtype=numpy.int64))] = True
+            mask &= offered
+        if query.min_providers is not None:
+            mask &= self.num_providers >= query.min_providers
+        if query.min_savings is not None:
+            mask &= self.savings >= query.min_savings
+        positions = numpy.flatnonzero(mask)
+
+        with self._lock:
+            self._filtered[key] = positions
+            if len(self._filtered) > FILTERED_POSITIONS_CACHE:
+                self._filtered.popitem(last=False)
+        return positions
+
+    def page(self, query):
+        """
+        (productos de la página, total filtrado, cursor siguiente o None)
+        """
+        positions = self.positions(query)
+        if query.cursor is not None:
+            start = int(numpy.searchsorted(positions, query.cursor))
+        else:
+            start = (query.page - 1) * query.limit
+        selected = positions[start:start + query.limit].tolist()
+        end = start + len(selected)
+        next_cursor = int(positions[end]) if end < len(positions) else None
+        return [self.products[i] for i in selected], len(positions), next_cursor
+
+
+class ResultCache:
+    """
+    Últimos ResultSet en memoria (LRU); 'latest' es el más reciente
+    """
+
+    def __init__(self, max_results):
+        self.max_results = max_results
+        self._results = OrderedDict()
+        self._latest = None
+        self._lock = threading.Lock()
+
+    def add(self, consolidated, stats, result_id=None):
+        """
+        Guarda el resultado y devuelve su id (None si la caché está desactivada)
+        """
+        if self.max_results <= 0:
+            return None
+        result = ResultSet(result_id or uuid.uuid4().hex, consolidated, stats)
+        with self._lock:
+            self._results[result.result_id] = result
+            self._latest = result.result_id
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return result.result_id
+
+    def get(self, result_id):
+        with self._lock:
+            if result_id == 'latest':
+                result_id = self._latest
+            result = self._results.get(result_id)
+            if result is not None:
+                self._results.move_to_end(result_id)
+            return result
+
+    def __len__(self):
+        return len(self._results)
+
+
+class SQLiteResultCache:
+    """
+    Últimos resultados en SQLite (compartidos entre procesos), con la misma
+    interfaz que ResultCache; 'latest' es el último agregado por cualquier proceso
+    """
+
+    def __init__(self, path, max_results):
+        self.path = path
+        self.max_results = max_results
+        self._loaded = ResultCache(max_results)  # ResultSet ya construidos en este proceso
+        self._lock = threading.Lock()
+        if max_results <= 0:
+            return
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                ' id TEXT PRIMARY KEY,'
+                ' created REAL NOT NULL,'
+                ' used REAL NOT NULL,'
+                ' stats TEXT NOT NULL,'
+                ' products TEXT NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add(self, consolidated, stats, result_id=None):
+        if self.max_results <= 0:
+            return None
+        result_id = result_id or uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO results (id, created, used, stats, products) VALUES (?, ?, ?, ?, ?)',
+                (result_id, now, now, json.dumps(stats), json.dumps(consolidated, ensure_ascii=False)),
+            )
+            # LRU por último uso, igual que en memoria
+            conn.execute(
+                'DELETE FROM results WHERE id NOT IN (SELECT id FROM results ORDER BY used DESC LIMIT ?)',
+                (self.max_results,),
+            )
+        self._loaded.add(consolidated, stats, result_id=result_id)
+        return result_id
+
+    def get(self, result_id):
+        if self.max_results <= 0:
+            return None
+        with self._connect() as conn:
+            if result_id == 'latest':
+                row = conn.execute('SELECT id FROM results ORDER BY created DESC LIMIT 1').fetchone()
+                if row is None:
+                    return None
+                result_id = row[0]
+            updated = conn.execute('UPDATE results SET used = ? WHERE id = ?', (time.time(), result_id))
+            if not updated.rowcount:
+                return None
+            result = self._loaded.get(result_id)
+            if result is not None:
+                return result
+            row = conn.execute('SELECT stats, products FROM results WHERE id = ?', (result_id,)).fetchone()
+        if row is None:
+            return None
+        self._loaded.add(json.loads(row[1]), json.loads(row[0]), result_id=result_id)
+        return self._loaded.get(result_id)
+
+    def __len__(self):
+        if self.max_results <= 0:
+            return 0
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+
+def _codes(values):
+    """
+    Strings -> (códigos int32, {string: código})
+    """
+    index = {}
+    codes = numpy.fromiter((index.setdefault(value, len(index)) for value in values), dtype=numpy.int32)
+    return codes, index
@@ -0,0 +1,137 @@
+"""
+Reglas de extracción de PDF (cabeceras, categorías y MOQ) cargadas de un
+archivo JSON y compiladas una sola vez.
+
+- Cabeceras: una sola expresión regular con todas las palabras clave
+  (equivale a buscar cada palabra en el texto en mayúsculas).
+- Categorías: una expresión con un grupo por categoría dentro de un
+  lookahead, así en cada posición gana la categoría de mayor prioridad y
+  basta una pasada para saber la primera categoría (en orden del archivo)
+  que aparece en la descripción.
+- MOQ: marcadores y patrón "<número> <unidad>" compilados.
+
+La sección "providers" permite agregar, por proveedor (nombre derivado del
+archivo, sin distinguir mayúsculas), palabras de cabecera, categorías (con
+prioridad sobre las generales), unidades de MOQ y otra categoría por defecto.
+"""
+import copy
+import hashlib
+import json
+import re
+
+
+class RuleSet:
+    """
+    Reglas compiladas para un proveedor (o las generales)
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.digest = hashlib.sha256(
+            json.dumps(config, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()[:16]
+
+        keywords = sorted({k.upper() for k in config['header_keywords']}, key=len, reverse=True)
+        self._header = re.compile('|'.join(re.escape(k) for k in keywords)) if keywords else None
+
+        self.default_category = config['default_category']
+        alternatives = []
+        self._category_by_group = {}
+        self._category_rank = {}
+        for index, category in enumerate(config['categories']):
+            words = sorted({w.lower() for w in category['words']}, key=len, reverse=True)
+            if not words:
+                continue
+            group = f"c{index}"
+            alternatives.append(f"(?P<{group}>{'|'.join(re.escape(w) for w in words)})")
+            self._category_by_group[group] = category['name']
+            self._category_rank[group] = index
+        self._category = re.compile(f"(?=(?:{'|'.join(alternatives)}))") if alternatives else None
+        self._top_rank = min(self._category_rank.values(), default=0)
+
+        moq = config['moq']
+        self.default_moq = moq['default']
+        markers = [re.escape(m.upper()) for m in moq['markers']]
+        self._moq_marker = re.compile('|'.join(markers)) if markers else None
+        self._moq_pattern = re.compile(
+            r'(\d+)\s*(?:' + '|'.join(re.escape(u) for u in moq['units']) + ')', re.IGNORECASE
+        )
+
+    def is_header(self, text_upper):
+        """
+        True si el texto (ya en mayúsculas) contiene alguna palabra de cabecera
+        """
+        return self._header is not None and self._header.search(text_upper) is not None
+
+    def category(self, description):
+        """
+        Primera categoría (en orden de prioridad) con alguna palabra en la descripción
+        """
+        if self._category is None:
+            return self.default_category
+        best = None
+        for match in self._category.finditer(description.lower()):
+            group = match.lastgroup
+            if best is None or self._category_rank[group] < self._category_rank[best]:
+                best = group
+                if self._category_rank[group] == self._top_rank:
+                    break
+        return self._category_by_group[best] if best is not None else self.default_category
+
+    def moq(self, texts):
+        """
+        MOQ del primer texto con un marcador (PIEZA, DOCENA...) y un "<número> <unidad>"
+        """
+        if self._moq_marker is None:
+            return self.default_moq
+        for text in texts:
+            if self._moq_marker.search(text.upper()):
+                match = self._moq_pattern.search(text)
+                if match:
+                    return int(match.group(1))
+        return self.default_moq
+
+
+class RuleEngine:
+    """
+    Reglas generales más las de cada proveedor, compiladas bajo demanda
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.base = RuleSet(self._base_config())
+        self._providers = {name.lower(): overrides for name, overrides in config.get('providers', {}).items()}
+        self._compiled = {}
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as fh:
+            return cls(json.load(fh))
+
+    def _base_config(self):
+        return {
+            'header_keywords': list(self.config['header_keywords']),
+            'categories': copy.deepcopy(self.config['categories']),
+            'default_category': self.config.get('default_category', 'GENERAL'),
+            'moq': copy.deepcopy(self.config['moq']),
+        }
+
+    def for_provider(self, provider=None):
+        """
+        RuleSet del proveedor (las generales si no tiene reglas propias)
+        """
+        overrides = self._providers.get(provider.lower()) if provider else None
+        if not overrides:
+            return self.base
+        key = provider.lower()
+        rules = self._compiled.get(key)
+        if rules is None:
+            config = self._base_config()
+            config['header_keywords'] += overrides.get('header_keywords', [])
+            config['categories'] = overrides.get('categories', []) + config['categories']
+            config['default_category'] = overrides.get('default_category', config['default_category'])
+            units = overrides.get('moq_units', [])
+            config['moq']['markers'] += units
+            config['moq']['units'] += units
+            rules = self._compiled[key] = RuleSet(config)
+        return rules
@@ -0,0 +1,227 @@
+"""
+Generador determinista de catálogos sintéticos de proveedores (PDF y XLSX).
+
+La misma semilla produce siempre el mismo contenido. Las imágenes son
+mosaicos de colores (phash distinto por semilla) con ruido opcional para
+controlar el tamaño del archivo. Una fracción de los productos (duplicate
+ratio) usa imágenes de un conjunto compartido que no depende del proveedor,
+así que se repiten dentro del catálogo y entre catálogos.
+"""
+import io
+import math
+import random
+
+import fitz  # PyMuPDF
+import numpy
+from openpyxl import Workbook
+from openpyxl.drawing.image import Image as XLImage
+from PIL import Image
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 en puntos
+HEADER_HEIGHT = 70
+SHARED_IMAGE_SEED = 10 ** 9  # Semillas del conjunto compartido de imágenes
+DEFAULT_IMAGE_PX = 160
+DEFAULT_NOISE = 24
+
+# Palabras que no chocan con las cabeceras que filtra el extractor
+ITEMS = ['Gorro tejido', 'Bufanda lana', 'Esfera navidad', 'Bolsa regalo', 'Tira led', 'Peluche reno',
+         'Vela aromática', 'Sombrero dama', 'Guirnalda luces', 'Papel envoltura']
+COLORS = ['rojo', 'verde', 'dorado', 'plateado', 'azul', 'blanco', 'negro', 'rosa']
+FILLER = ['Color surtido', 'Material mixto', 'Temporada invierno', 'Entrega inmediata', 'Varios tamaños']
+
+
+def product_image(seed, size=DEFAULT_IMAGE_PX, noise=DEFAULT_NOISE):
+    """
+    JPEG de size x size: mosaico 8x8 definido por la semilla más ruido
+    """
+    rng = numpy.random.default_rng(seed)
+    tiles = rng.integers(0, 256, (8, 8, 3), dtype=numpy.uint8)
+    image = Image.fromarray(tiles, 'RGB').resize((size, size), Image.Resampling.NEAREST)
+    if noise:
+        pixels = numpy.asarray(image, dtype=numpy.int16)
+        pixels = pixels + rng.integers(-noise, noise + 1, pixels.shape, dtype=numpy.int16)
+        image = Image.fromarray(numpy.clip(pixels, 0, 255).astype(numpy.uint8), 'RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def image_seeds(count, duplicate_ratio, seed):
+    """
+    Semilla de imagen por producto. Con probabilidad duplicate_ratio se toma
+    una del conjunto compartido (count // 4 imágenes), si no una única.
+    """
+    rng = random.Random(seed)
+    shared = max(1, count // 4)
+    seeds = []
+    for i in range(count):
+        if rng.random() < duplicate_ratio:
+            seeds.append(SHARED_IMAGE_SEED + rng.randrange(shared))
+        else:
+            seeds.append((seed + 1) * 10 ** 7 + i)
+    return seeds
+
+
+def image_px_for_size(target_mb, unique_images, noise=DEFAULT_NOISE):
+    """
+    Lado de imagen (px) para que el catálogo pese aproximadamente target_mb
+    """
+    reference_px = 256
+    reference_bytes = len(product_image(0, reference_px, noise))
+    bytes_per_image = target_mb * 1024 * 1024 / max(1, unique_images)
+    px = reference_px * math.sqrt(bytes_per_image / reference_bytes)
+    return max(32, min(4000, int(px)))
+
+
+def product_rows(count, seed):
+    """
+    Texto de cada producto: (descripción, sku, precios, moq)
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        description = f"{rng.choice(ITEMS)} {rng.choice(COLORS)} {i + 1}"
+        price = rng.randint(20, 900)
+        prices = (price, price + rng.randint(5, 50), price + rng.randint(60, 120))
+        rows.append((description, f"S{seed % 100:02d}{i:05d}", prices, rng.choice((6, 12, 24, 48))))
+    return rows
+
+
+class _ImageCache:
+    """
+    Bytes de imagen por semilla (las compartidas se codifican una sola vez)
+    """
+
+    def __init__(self, size, noise):
+        self.size = size
+        self.noise = noise
+        self._images = {}
+
+    def get(self, seed):
+        image = self._images.get(seed)
+        if image is None:
+            image = product_image(seed, self.size, self.noise)
+            if seed >= SHARED_IMAGE_SEED:
+                self._images[seed] = image
+        return image
+
+
+def generate_pdf(path, pages=10, images_per_page=6, blocks_per_row=4, duplicate_ratio=0.3,
+                 image_px=DEFAULT_IMAGE_PX, noise=DEFAULT_NOISE, seed=0):
+    """
+    Catálogo PDF: una cabecera por página y filas de imagen + bloques de texto.
+    Los bloques son descripción, SKU, precios, MOQ y después texto de relleno.
+    Devuelve el número de productos.
+    """
+    count = pages * images_per_page
+    seeds = image_seeds(count, duplicate_ratio, seed)
+    rows = product_rows(count, seed)
+    images = _ImageCache(image_px, noise)
+    row_height = (PAGE_HEIGHT - HEADER_HEIGHT - 20) / images_per_page
+    image_side = max(8, min(100, row_height - 6))
+
+    doc = fitz.open()
+    try:
+        for page_index in range(pages):
+            page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+            page.insert_text((40, 45), 'FOTO      DESCRIPCION      SKU      PRECIO MAYOREO      MOQ', fontsize=9)
+            for slot in range(images_per_page):
+                i = page_index * images_per_page + slot
+                description, sku, prices, moq = rows[i]
+                center = HEADER_HEIGHT + row_height * (slot + 0.5)
+                top = center - image_side / 2
+                page.insert_image(fitz.Rect(30, top, 30 + image_side, top + image_side), stream=images.get(seeds[i]))
+
+                texts = [description, sku, ' '.join(str(p) for p in prices), f"{moq} PIEZAS"]
+                texts += [FILLER[k % len(FILLER)] for k in range(max(0, blocks_per_row - len(texts)))]
+                texts = texts[:blocks_per_row]
+                for k, text in enumerate(texts):
+                    # Columnas y líneas alternadas para que cada texto sea su propio bloque
+                    x = 150 + (k % 3) * 140
+                    y = center + 3 + (k - (len(texts) - 1) / 2) * 11
+                    page.insert_text((x, y), text, fontsize=8)
+        doc.save(path, garbage=3, deflate=True)
+    finally:
+        doc.close()
+    return count
+
+
+def generate_xlsx(path, products=60, duplicate_ratio=0.3, image_px=DEFAULT_IMAGE_PX,
+                  noise=DEFAULT_NOISE, seed=0):
+    """
+    Catálogo Excel con una imagen anclada en la columna G de cada fila.
+    Devuelve el número de productos.
+    """
+    seeds = image_seeds(products, duplicate_ratio, seed)
+    rows = product_rows(products, seed)
+    images = _ImageCache(image_px, noise)
+
+    wb = Workbook()
+    sheet = wb.active
+    sheet.append(['SKU', 'Descripcion', 'Precio Menudeo', 'Precio Caja', 'MOQ', 'Categoria', 'Foto'])
+    for i, (description, sku, prices, moq) in enumerate(rows):
+        sheet.append([sku, description, prices[0], prices[2], moq, None])
+        sheet.add_image(XLImage(io.BytesIO(images.get(seeds[i]))), f"G{i + 2}")
+    wb.save(path)
+    return products
+
+
+VARIANTS = ('crop', 'recolor', 'recompress', 'resize', 'border')
+
+
+def labeled_images(products=100, variants=4, family_size=3, size=DEFAULT_IMAGE_PX,
+                   noise=DEFAULT_NOISE, changed_tiles=12, seed=0):
+    """
+    Muestra etiquetada para evaluar huellas de imagen: lista de (etiqueta,
+    bytes JPEG). Cada producto aparece con su imagen y `variants` variantes
+    como las que publica otro proveedor (recorte, color/brillo,
+    recompresión, otro tamaño, margen blanco). Los productos vienen en
+    familias de family_size que comparten el mosaico salvo changed_tiles
+    mosaicos: se ven parecidos pero son productos distintos.
+    """
+    rng = numpy.random.default_rng(seed)
+    sample = []
+    for label in range(products):
+        if label % family_size == 0:
+            family = rng.integers(0, 256, (8, 8, 3), dtype=numpy.uint8)
+        tiles = family.copy()
+        changed = rng.choice(64, changed_tiles, replace=False)
+        tiles.reshape(64, 3)[changed] = rng.integers(0, 256, (changed_tiles, 3), dtype=numpy.uint8)
+
+        image = Image.fromarray(tiles, 'RGB').resize((size, size), Image.Resampling.NEAREST)
+        if noise:
+            pixels = numpy.asarray(image, dtype=numpy.int16)
+            pixels = pixels + rng.integers(-noise, noise + 1, pixels.shape, dtype=numpy.int16)
+            image = Image.fromarray(numpy.clip(pixels, 0, 255).astype(numpy.uint8), 'RGB')
+
+        sample.append((label, _jpeg(image, 85)))
+        for k in range(variants):
+            sample.append((label, _variant(image, VARIANTS[k % len(VARIANTS)], rng)))
+    return sample
+
+
+def _variant(image, kind, rng):
+    size = image.width
+    if kind == 'crop':
+        margin = int(size * rng.uniform(0.04, 0.1))
+        return _jpeg(image.crop((margin, margin, size - margin, size - margin)).resize((size, size)), 85)
+    if kind == 'recolor':
+        pixels = numpy.asarray(image, dtype=numpy.float64)
+        pixels = pixels * rng.uniform(0.75, 1.25, 3) + rng.uniform(-20, 20)
+        return _jpeg(Image.fromarray(numpy.clip(pixels, 0, 255).astype(numpy.uint8), 'RGB'), 85)
+    if kind == 'recompress':
+        return _jpeg(image, 30)
+    if kind == 'resize':
+        half = max(16, size // 2)
+        return _jpeg(image.resize((half, half), Image.Resampling.BILINEAR), 85)
+    # border: foto con margen blanco
+    margin = int(size * rng.uniform(0.05, 0.12))
+    framed = Image.new('RGB', (size + 2 * margin, size + 2 * margin), (255, 255, 255))
+    framed.paste(image, (margin, margin))
+    return _jpeg(framed, 85)
+
+
+def _jpeg(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
@@ -0,0 +1,122 @@
+"""
+Equivalencias de las que dependen la caché, los benchmarks y los modos de
+ejecución: cada optimización debe dar exactamente el mismo resultado que
+el camino original.
+
+    python -m pytest -q test_equivalence.py
+"""
+import io
+import json
+import os
+
+import imagehash
+import numpy
+import pytest
+from PIL import Image
+
+import main
+import synthetic_catalogs
+from hashing import PhashEngine
+
+
+@pytest.fixture(scope='module')
+def catalogs(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('catalogs')
+    pdf = str(directory / 'provA.pdf')
+    xlsx = str(directory / 'provB.xlsx')
+    synthetic_catalogs.generate_pdf(pdf, pages=3, images_per_page=6, seed=1)
+    synthetic_catalogs.generate_xlsx(xlsx, products=24, seed=2)
+    return [pdf, xlsx]
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    # Sin caché ni memo: cada corrida extrae y hashea de verdad
+    monkeypatch.setattr(main, 'extraction_cache', None)
+    main._image_hash_memo.clear()
+
+
+def consolidate(paths, **form):
+    """
+    Respuesta de /api/consolidate sin los campos que cambian entre corridas
+    """
+    client = main.app.test_client()
+    files = [(open(path, 'rb'), os.path.basename(path)) for path in paths]
+    response = client.post('/api/consolidate', data={'files': files, **form}, content_type='multipart/form-data')
+    assert response.status_code == 200
+    result = response.get_json()
+    for name in ('memory', 'resultId'):
+        result.pop(name, None)
+    return json.dumps(result, sort_keys=True, ensure_ascii=False)
+
+
+def sample_images():
+    """
+    Imágenes en varios modos y formatos, algunas mayores que MAX_IMAGE_SIZE
+    """
+    rng = numpy.random.default_rng(7)
+    images = []
+    for i in range(40):
+        size = (int(rng.integers(16, 1200)), int(rng.integers(16, 1200)))
+        tiles = rng.integers(0, 256, (6, 6, 4), dtype=numpy.uint8)
+        base = Image.fromarray(tiles, 'RGBA').resize(size, Image.Resampling.BILINEAR)
+        mode, image_format = [
+            ('RGB', 'JPEG'), ('L', 'JPEG'), ('RGBA', 'PNG'), ('P', 'PNG'), ('LA', 'PNG'), ('CMYK', 'JPEG'),
+        ][i % 6]
+        image = base.convert(mode) if mode != 'P' else base.convert('RGB').quantize(64)
+        buffer = io.BytesIO()
+        image.save(buffer, image_format)
+        images.append(buffer.getvalue())
+    return images
+
+
+def test_exact_engine_matches_imagehash_phash():
+    engine = PhashEngine('exact', main.HASH_SIZE, main.MAX_IMAGE_SIZE)
+    images = sample_images()
+
+    expected = []
+    for image_bytes in images:
+        # Preprocesado del extractor original antes de imagehash.phash
+        image = Image.open(io.BytesIO(image_bytes))
+        image.thumbnail(main.MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        expected.append(str(imagehash.phash(image, hash_size=main.HASH_SIZE)))
+
+    assert engine.hash_many(images) == expected
+
+
+def test_process_mode_matches_sequential(catalogs, monkeypatch):
+    monkeypatch.setattr(main, 'EXECUTION_MODE', 'sequential')
+    sequential = consolidate(catalogs)
+
+    monkeypatch.setattr(main, 'EXECUTION_MODE', 'process')
+    monkeypatch.setattr(main, 'MAX_WORKERS', 2)
+    try:
+        parallel = consolidate(catalogs)
+    finally:
+        if main._process_pool is not None:
+            main._process_pool.shutdown()
+            main._process_pool = None
+
+    assert parallel == sequential
+
+
+@pytest.mark.parametrize('grouping', ['exact', 'similar'])
+def test_table_engine_matches_dicts(catalogs, monkeypatch, grouping):
+    monkeypatch.setattr(main, 'CONSOLIDATION_ENGINE', 'dicts')
+    dicts = consolidate(catalogs, grouping=grouping)
+
+    monkeypatch.setattr(main, 'CONSOLIDATION_ENGINE', 'table')
+    assert main.use_product_table()
+    assert consolidate(catalogs, grouping=grouping) == dicts
+
+
+def test_fast_excel_engine_matches_openpyxl(catalogs, monkeypatch):
+    xlsx = [path for path in catalogs if path.endswith('.xlsx')]
+
+    monkeypatch.setattr(main, 'EXCEL_ENGINE', 'openpyxl')
+    full = consolidate(xlsx)
+
+    monkeypatch.setattr(main, 'EXCEL_ENGINE', 'fast')
+    assert consolidate(xlsx) == full
@@ -0,0 +1,24 @@
+"""
+Punto de entrada WSGI para producción:
+
+    gunicorn -c gunicorn.conf.py
+
+create_app() importa la API (al importar main se cargan PyMuPDF, openpyxl,
+Pillow, NumPy/SciPy y las reglas) y, salvo WARM_UP=off, ejecuta una vez las
+rutas de hash, PDF y Excel (main.warm_up). Con preload_app el master lo hace
+una sola vez antes del fork y los workers nacen con todo cargado.
+"""
+import os
+
+import main
+
+WARM_UP = os.environ.get('WARM_UP', 'on').lower() != 'off'
+
+
+def create_app(warm_up=WARM_UP):
+    if warm_up:
+        main.warm_up()
+    return main.app
+
+
+app = create_app()